@@ -0,0 +1,122 @@
+"""
+Benchmark the embedding backends against the fp32 PyTorch baseline
+
+Reports encoding throughput (posts/sec) for every backend and the cosine
+similarity drift of its embeddings from the torch backend on the same posts.
+
+Usage:
+    python -m benchmarks.embedding_backends --backends torch onnx onnx-int8 \
+        --posts posts.json --output embedding_backends.json
+"""
+import argparse
+import json
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from embedding_backends import BACKENDS, EMBEDDING_MAX_SEQ_LENGTH, EMBEDDING_THREADS, load_embedding_model
+from utils import EMBEDDING_BATCH_SIZE, EMBEDDING_MODEL
+
+# Used when no posts file is given
+SAMPLE_TEXTS = [
+    "The app keeps crashing every time I try to upload a photo, this is so frustrating.",
+    "Customer support never answers my emails and I have been waiting for weeks.",
+    "Why is the new update so slow? Everything takes forever to load now.",
+    "I hate that they removed the dark mode option, my eyes hurt at night.",
+    "Billing charged me twice this month and nobody can explain why.",
+    "The documentation is outdated and none of the examples work anymore.",
+    "Battery drains in a few hours since the last firmware update.",
+    "Login with two factor authentication fails half of the time.",
+]
+
+
+def load_texts(path: str, count: int) -> List[str]:
+    """
+    Load post texts from a JSON list of post dictionaries, repeated up to count texts
+    """
+    if path:
+        with open(path) as f:
+            posts = json.load(f)
+        texts = [post.get('content') or post.get('title', '') for post in posts]
+    else:
+        texts = SAMPLE_TEXTS
+    # Vary repeated texts slightly so every text is encoded
+    return [f"{texts[i % len(texts)]} ({i})" for i in range(count)]
+
+
+def run_backend(backend: str, texts: List[str], batch_size: int, threads: int, max_seq_length: int) -> Tuple[np.ndarray, Dict]:
+    start = time.perf_counter()
+    model = load_embedding_model(EMBEDDING_MODEL, backend, threads=threads, max_seq_length=max_seq_length)
+    load_seconds = time.perf_counter() - start
+
+    # Warm up kernels and caches before timing
+    model.encode(texts[:batch_size], batch_size=batch_size, show_progress_bar=False)
+
+    start = time.perf_counter()
+    embeddings = model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+    seconds = time.perf_counter() - start
+    return np.asarray(embeddings, dtype=np.float32), {
+        "backend": backend,
+        "posts": len(texts),
+        "load_seconds": round(load_seconds, 3),
+        "encode_seconds": round(seconds, 3),
+        "posts_per_sec": round(len(texts) / seconds, 1),
+    }
+
+
+def cosine_drift(baseline: np.ndarray, embeddings: np.ndarray) -> Dict:
+    """
+    Cosine similarity between each embedding and its baseline counterpart
+    """
+    a = baseline / np.linalg.norm(baseline, axis=1, keepdims=True)
+    b = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    similarity = (a * b).sum(axis=1)
+    return {
+        "mean_cosine": round(float(similarity.mean()), 5),
+        "min_cosine": round(float(similarity.min()), 5),
+        "mean_drift": round(float(1 - similarity.mean()), 5),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--posts", default="", help="JSON file with a list of post dictionaries")
+    parser.add_argument("--count", type=int, default=1000, help="Number of posts to encode")
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=EMBEDDING_THREADS)
+    parser.add_argument("--max-seq-length", type=int, default=EMBEDDING_MAX_SEQ_LENGTH)
+    parser.add_argument("--output", default="", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    texts = load_texts(args.posts, args.count)
+    backends = ["torch"] + [backend for backend in args.backends if backend != "torch"]
+
+    results = []
+    baseline = None
+    for backend in backends:
+        embeddings, result = run_backend(backend, texts, args.batch_size, args.threads, args.max_seq_length)
+        if baseline is None:
+            baseline = embeddings
+        result.update(cosine_drift(baseline, embeddings))
+        results.append(result)
+        print(
+            f"{backend:>10}: {result['posts_per_sec']:>8} posts/sec, "
+            f"mean cosine to torch {result['mean_cosine']} (min {result['min_cosine']})"
+        )
+
+    report = {
+        "model": EMBEDDING_MODEL,
+        "batch_size": args.batch_size,
+        "threads": args.threads,
+        "max_seq_length": args.max_seq_length,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
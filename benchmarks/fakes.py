@@ -0,0 +1,307 @@
+"""
+Offline stand-ins for Reddit and Gemini used by the benchmarks
+
+FakeReddit replays recorded subreddit search results with the small part of the
+AsyncPRAW interface the pipeline uses. FakeRedditServer serves them over HTTP
+like the Reddit API, including its rate limit; point AsyncPRAW at it with
+REDDIT_OAUTH_URL and REDDIT_AUTH_URL. StubLLMServer answers Gemini
+generateContent requests locally after a configurable latency; point the app at
+it with GEMINI_BASE_URL.
+"""
+import asyncio
+import json
+import random
+import re
+import time
+from types import SimpleNamespace
+from typing import Dict, List
+
+from aiohttp import web
+
+# Pain points and other posts the synthetic fixtures are built from
+SYNTHETIC_TOPICS = {
+    "crashes": "The app crashes every time I {action}, and I lose everything I was working on.",
+    "billing": "I was charged twice for my {plan} subscription and support will not refund me.",
+    "performance": "Since the last update it takes forever to {action}, everything is so slow.",
+    "login": "Login keeps failing with two factor authentication when I {action}.",
+    "docs": "The documentation for {plan} is outdated and none of the examples work.",
+    "battery": "Battery drains in a few hours whenever I {action}, it never used to.",
+    "showcase": "I built a small tool to {action} over the weekend, feedback welcome.",
+}
+SYNTHETIC_ACTIONS = ["upload a photo", "open a large file", "sync my calendar", "export a report",
+                     "switch accounts", "share a link", "print a document", "search my notes"]
+SYNTHETIC_PLANS = ["Pro", "Team", "Family", "Business", "Student"]
+SEARCH_PAGE_SIZE = 100
+
+
+def synthetic_fixtures(subreddits: List[str], posts_per_subreddit: int, seed: int = 0) -> Dict[str, List[Dict]]:
+    """
+    Build search results in the recorded fixture format without calling Reddit
+    """
+    rng = random.Random(seed)
+    fixtures = {}
+    for subreddit in subreddits:
+        posts = []
+        for i in range(posts_per_subreddit):
+            topic = rng.choice(list(SYNTHETIC_TOPICS))
+            text = SYNTHETIC_TOPICS[topic].format(action=rng.choice(SYNTHETIC_ACTIONS), plan=rng.choice(SYNTHETIC_PLANS))
+            posts.append({
+                "id": f"{subreddit}_{i}",
+                "title": f"{topic.title()} problem #{i} in r/{subreddit}",
+                "selftext": f"{text} This is post {i} of r/{subreddit}.",
+                "url": f"https://www.reddit.com/r/{subreddit}/comments/{subreddit}_{i}/",
+                "score": rng.randint(0, 500),
+                "num_comments": rng.randint(0, 100),
+            })
+        fixtures[subreddit] = posts
+    return fixtures
+
+
+async def record_fixtures(subreddits: List[str], limit: int, search_query: str) -> Dict[str, List[Dict]]:
+    """
+    Record real search results for subreddits with the configured Reddit credentials
+    """
+    from get_data import get_reddit, get_reddit_posts_async, close_reddit
+
+    reddit = await get_reddit()
+    fixtures = {}
+    try:
+        for subreddit in subreddits:
+            posts = await get_reddit_posts_async(reddit, subreddit, limit, search_query)
+            fixtures[subreddit] = [
+                {
+                    "id": post.id,
+                    "title": post.title,
+                    "selftext": post.selftext,
+                    "url": post.url,
+                    "score": post.score,
+                    "num_comments": post.num_comments,
+                }
+                for post in posts
+            ]
+    finally:
+        await close_reddit()
+    return fixtures
+
+
+class FakeSubreddit:
+    def __init__(self, name: str, posts: List[Dict], latency: float):
+        self.display_name = name
+        self._posts = posts
+        self._latency = latency
+
+    async def search(self, query: str, limit: int = 100, sort: str = "relevance", time_filter: str = "all"):
+        posts = self._posts[:limit]
+        # Reddit returns search results in pages of up to 100
+        for page_start in range(0, max(len(posts), 1), SEARCH_PAGE_SIZE):
+            await asyncio.sleep(self._latency)
+            for post in posts[page_start:page_start + SEARCH_PAGE_SIZE]:
+                yield SimpleNamespace(crosspost_parent=None, **post)
+
+
+class FakeReddit:
+    """
+    Replay recorded search results in place of an asyncpraw.Reddit instance
+
+    Args:
+        fixtures: Recorded posts keyed by subreddit name
+        latency: Seconds each page of search results takes, to mimic the Reddit API
+    """
+
+    def __init__(self, fixtures: Dict[str, List[Dict]], latency: float = 0.0):
+        self.fixtures = {name.lower(): posts for name, posts in fixtures.items()}
+        self.latency = latency
+
+    async def subreddit(self, name: str) -> FakeSubreddit:
+        if name.lower() not in self.fixtures:
+            raise ValueError(f"No recorded results for r/{name}")
+        return FakeSubreddit(name, self.fixtures[name.lower()], self.latency)
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeRedditServer:
+    """
+    Local Reddit API serving recorded search results under a fixed-window rate limit
+
+    Answers the calls the app makes (OAuth token, subreddit search, subreddit
+    name search and info), reports the quota in X-Ratelimit headers like
+    Reddit does and answers 429 once it is used up.
+
+    Args:
+        fixtures: Recorded posts keyed by subreddit name
+        limit: Requests allowed per window
+        window: Seconds per rate-limit window
+        latency: Seconds each response takes
+        port: Port to listen on (0 picks a free one)
+    """
+
+    def __init__(self, fixtures: Dict[str, List[Dict]], limit: int = 600, window: float = 600,
+                 latency: float = 0.0, port: int = 0):
+        self.fixtures = {name.lower(): posts for name, posts in fixtures.items()}
+        self.limit = limit
+        self.window = window
+        self.latency = latency
+        self.port = port
+        self.requests = 0
+        self.throttled = 0
+        self._window_start = time.monotonic()
+        self._used = 0
+        self._runner = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def _rate_limit_headers(self) -> Dict[str, str]:
+        now = time.monotonic()
+        if now - self._window_start >= self.window:
+            self._window_start, self._used = now, 0
+        return {
+            "X-Ratelimit-Used": str(self._used),
+            "X-Ratelimit-Remaining": str(max(0, self.limit - self._used)),
+            "X-Ratelimit-Reset": str(max(0, int(self._window_start + self.window - now))),
+        }
+
+    @web.middleware
+    async def _rate_limit(self, request: web.Request, handler):
+        if request.path == "/api/v1/access_token":
+            return await handler(request)
+        self.requests += 1
+        headers = self._rate_limit_headers()
+        if self._used >= self.limit:
+            self.throttled += 1
+            return web.json_response({"message": "Too Many Requests", "error": 429}, status=429, headers=headers)
+        self._used += 1
+        await asyncio.sleep(self.latency)
+        response = await handler(request)
+        response.headers.update(self._rate_limit_headers())
+        return response
+
+    async def _access_token(self, request: web.Request) -> web.Response:
+        return web.json_response({"access_token": "fake", "token_type": "bearer", "expires_in": 86400, "scope": "*"})
+
+    async def _search(self, request: web.Request) -> web.Response:
+        name = request.match_info["subreddit"]
+        posts = self.fixtures.get(name.lower(), [])
+        limit = min(int(request.query.get("limit", "25")), SEARCH_PAGE_SIZE)
+        after = request.query.get("after")
+        start = 0
+        if after:
+            ids = [f"t3_{post['id']}" for post in posts]
+            start = ids.index(after) + 1 if after in ids else len(posts)
+        page = posts[start:start + limit]
+        children = [
+            {"kind": "t3", "data": {
+                **post,
+                "name": f"t3_{post['id']}",
+                "subreddit": name,
+                "permalink": f"/r/{name}/comments/{post['id']}/",
+            }}
+            for post in page
+        ]
+        next_after = children[-1]["data"]["name"] if page and start + limit < len(posts) else None
+        return web.json_response({"kind": "Listing", "data": {"after": next_after, "before": None, "children": children}})
+
+    async def _search_names(self, request: web.Request) -> web.Response:
+        query = (await request.post()).get("query", "")
+        # Distinct names per query, so every search also looks up uncached metadata
+        return web.json_response({"names": [f"{query}_{i}" for i in range(3)]})
+
+    async def _info(self, request: web.Request) -> web.Response:
+        names = [name for name in request.query.get("sr_name", "").split(",") if name]
+        children = [
+            {"kind": "t5", "data": {
+                "display_name": name,
+                "name": f"t5_{i}",
+                "public_description": f"Fake r/{name}",
+                "subscribers": 1000 * (i + 1),
+                "community_icon": "",
+                "icon_img": "",
+            }}
+            for i, name in enumerate(names)
+        ]
+        return web.json_response({"kind": "Listing", "data": {"after": None, "before": None, "children": children}})
+
+    async def start(self) -> None:
+        app = web.Application(middlewares=[self._rate_limit])
+        app.router.add_post("/api/v1/access_token", self._access_token)
+        app.router.add_get("/r/{subreddit}/search/", self._search)
+        app.router.add_post("/api/search_reddit_names/", self._search_names)
+        app.router.add_get("/api/info/", self._info)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class StubLLMServer:
+    """
+    Local server answering Gemini generateContent calls with a fixed category,
+    or one per cluster for batch summary prompts
+
+    Args:
+        latency: Seconds each response takes
+        port: Port to listen on (0 picks a free one)
+    """
+
+    def __init__(self, latency: float = 0.5, port: int = 0):
+        self.latency = latency
+        self.port = port
+        self.requests = 0
+        self._runner = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def _generate_content(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        prompt = "".join(
+            part.get("text", "")
+            for content in body.get("contents", [])
+            for part in content.get("parts", [])
+        )
+        answer = {"category": f"Stub category {self.requests}", "pain_points": "Users report recurring problems."}
+        cluster_ids = re.findall(r"^Cluster (-?\d+):$", prompt, flags=re.MULTILINE)
+        if cluster_ids:
+            # A batch summary prompt (prompts.BATCH_SUMMARY_PROMPT) gets one entry per cluster
+            answer = {"categories": [
+                {"cluster_id": int(cluster_id), "category": f"Stub category {self.requests}.{cluster_id}",
+                 "pain_points": "Users report recurring problems."}
+                for cluster_id in cluster_ids
+            ]}
+        return web.json_response({
+            "candidates": [{
+                "content": {"role": "model", "parts": [{"text": json.dumps(answer)}]},
+                "finishReason": "STOP",
+            }],
+            "usageMetadata": {
+                "promptTokenCount": len(prompt) // 4,
+                "candidatesTokenCount": 20,
+                "totalTokenCount": len(prompt) // 4 + 20,
+            },
+        })
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post("/{version}/models/{model}:generateContent", self._generate_content)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,277 @@
+"""
+Benchmark the /analyze pipeline offline
+
+Replays recorded (or synthetic) subreddit search results through
+get_posts_from_subreddits and answers LLM calls with a local stub Gemini
+server, then reports:
+
+- the time of each stage (fetch, filter, embed, cluster, summarize) per corpus size
+- end-to-end /analyze throughput and latency through the FastAPI app per concurrency level
+
+Caches are written to a fresh temporary directory, so every stage runs cold.
+Compare the JSON output between commits to catch regressions.
+
+Usage:
+    python -m benchmarks.pipeline --sizes 50 500 5000 --llm-latency 0.5 \
+        --concurrency 1 4 16 --output pipeline.json
+    python -m benchmarks.pipeline --record fixtures.json --subreddits python devops
+    python -m benchmarks.pipeline --fixtures fixtures.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.fakes import FakeReddit, StubLLMServer, record_fixtures, synthetic_fixtures
+
+DEFAULT_SUBREDDITS = ["python", "devops", "androiddev", "sysadmin", "webdev"]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))]
+
+
+def _shuffle_words(text: str, rng: random.Random) -> str:
+    words = text.split()
+    rng.shuffle(words)
+    return " ".join(words)
+
+
+def _fixtures_for(fixtures: Dict[str, List[Dict]], size: int) -> Dict[str, List[Dict]]:
+    """
+    Repeat recorded posts until their subreddits hold size posts
+
+    Repeats get unique ids and their words shuffled, which keeps their topic
+    but changes their word shingles, so filter_posts does not remove them as
+    near-duplicates of the original.
+    """
+    rng = random.Random(0)
+    per_subreddit = -(-size // len(fixtures))
+    scaled = {}
+    for name, posts in fixtures.items():
+        scaled[name] = []
+        for i in range(per_subreddit):
+            post = posts[i % len(posts)]
+            if i < len(posts):
+                scaled[name].append(post)
+                continue
+            scaled[name].append({
+                **post,
+                "id": f"{post['id']}_{i}",
+                "title": _shuffle_words(post["title"], rng),
+                "selftext": _shuffle_words(post["selftext"], rng),
+            })
+    return scaled
+
+
+async def benchmark_stages(fixtures: Dict[str, List[Dict]], size: int, reddit_latency: float) -> Dict:
+    """
+    Run the pipeline stages one after another on size posts and time each of them
+    """
+    import get_data
+    from filtering import filter_posts, post_text
+    from utils import categorize_posts, embed_texts, summarize_pain_points
+
+    scaled = _fixtures_for(fixtures, size)
+    get_data._shared_reddit = FakeReddit(scaled, latency=reddit_latency)
+    timings = {}
+
+    start = time.perf_counter()
+    posts, failed = await get_data.get_posts_from_subreddits(
+        list(scaled), search_limit=max(len(p) for p in scaled.values()), use_cache=False
+    )
+    timings["fetch"] = time.perf_counter() - start
+    if failed:
+        raise RuntimeError(f"Fetching fixtures failed: {failed}")
+    posts = posts[:size]
+
+    start = time.perf_counter()
+    posts, filtered = filter_posts(posts)
+    timings["filter"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    embed_texts([post_text(post) for post in posts])
+    timings["embed"] = time.perf_counter() - start
+
+    # Reads the embeddings stored by the previous stage, so this times scoring and clustering
+    start = time.perf_counter()
+    categorized_posts = categorize_posts(posts)
+    timings["cluster"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    categories = await summarize_pain_points(categorized_posts, use_cache=False)
+    timings["summarize"] = time.perf_counter() - start
+
+    return {
+        "size": size,
+        # Posts left for clustering and summarization
+        "posts": len(posts),
+        "filtered": filtered,
+        "clusters": len([cluster for cluster in categorized_posts if cluster != -1]),
+        "categories": len(categories),
+        "seconds": {stage: round(seconds, 4) for stage, seconds in timings.items()},
+        "total_seconds": round(sum(timings.values()), 4),
+    }
+
+
+async def benchmark_throughput(
+    fixtures: Dict[str, List[Dict]],
+    posts_per_request: int,
+    concurrency_levels: List[int],
+    requests_per_level: int,
+    reddit_latency: float,
+) -> List[Dict]:
+    """
+    Send concurrent /analyze requests through the FastAPI app and measure throughput
+    """
+    import httpx
+    import get_data
+    import main
+
+    scaled = _fixtures_for(fixtures, posts_per_request)
+    get_data._shared_reddit = FakeReddit(scaled, latency=reddit_latency)
+    body = {
+        "subreddits": list(scaled),
+        "search_limit": max(len(posts) for posts in scaled.values()),
+        "bypass_cache": True,
+    }
+
+    results = []
+    async with main.lifespan(main.app):
+        while not main.warmup_state["ready"]:
+            if main.warmup_state["error"]:
+                raise RuntimeError(f"Warm-up failed: {main.warmup_state['error']}")
+            await asyncio.sleep(0.1)
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for concurrency in concurrency_levels:
+                semaphore = asyncio.Semaphore(concurrency)
+                latencies = []
+                status_codes: Dict[str, int] = {}
+
+                async def send() -> None:
+                    async with semaphore:
+                        start = time.perf_counter()
+                        response = await client.post("/analyze", json=body)
+                        latencies.append(time.perf_counter() - start)
+                        status_codes[str(response.status_code)] = status_codes.get(str(response.status_code), 0) + 1
+
+                start = time.perf_counter()
+                await asyncio.gather(*(send() for _ in range(requests_per_level)))
+                seconds = time.perf_counter() - start
+                results.append({
+                    "concurrency": concurrency,
+                    "requests": requests_per_level,
+                    "posts_per_request": posts_per_request,
+                    "seconds": round(seconds, 3),
+                    "requests_per_sec": round(requests_per_level / seconds, 3),
+                    "latency_p50": round(statistics.median(latencies), 3),
+                    "latency_p95": round(_percentile(latencies, 95), 3),
+                    "status_codes": status_codes,
+                })
+                print(
+                    f"concurrency {concurrency:>3}: {results[-1]['requests_per_sec']} req/s, "
+                    f"p50 {results[-1]['latency_p50']}s, p95 {results[-1]['latency_p95']}s, {status_codes}"
+                )
+    return results
+
+
+async def run(args: argparse.Namespace, llm_port: int) -> Dict:
+    if args.fixtures:
+        with open(args.fixtures) as f:
+            fixtures = json.load(f)
+    else:
+        fixtures = synthetic_fixtures(args.subreddits, posts_per_subreddit=200)
+
+    llm_server = StubLLMServer(latency=args.llm_latency, port=llm_port)
+    await llm_server.start()
+    try:
+        stages = []
+        for size in args.sizes:
+            result = await benchmark_stages(fixtures, size, args.reddit_latency)
+            stages.append(result)
+            print(
+                f"{size:>6} posts ({result['posts']} after filtering): "
+                + ", ".join(f"{stage} {seconds}s" for stage, seconds in result["seconds"].items())
+            )
+
+        throughput = []
+        if args.concurrency:
+            throughput = await benchmark_throughput(
+                fixtures, args.request_posts, args.concurrency, args.requests, args.reddit_latency
+            )
+    finally:
+        await llm_server.stop()
+
+    return {
+        "commit": _git_commit(),
+        "fixtures": args.fixtures or "synthetic",
+        "reddit_latency": args.reddit_latency,
+        "llm_latency": args.llm_latency,
+        "llm_requests": llm_server.requests,
+        "stages": stages,
+        "throughput": throughput,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", default="", help="Recorded search results; synthetic posts are used without it")
+    parser.add_argument("--record", default="", help="Record search results of --subreddits to this file and exit")
+    parser.add_argument("--subreddits", nargs="+", default=DEFAULT_SUBREDDITS)
+    parser.add_argument("--record-limit", type=int, default=100, help="Posts recorded per subreddit")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[50, 500, 5000], help="Corpus sizes for the stage timings")
+    parser.add_argument("--reddit-latency", type=float, default=0.3, help="Seconds each replayed page of search results takes")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds each stub LLM response takes")
+    parser.add_argument("--concurrency", nargs="*", type=int, default=[1, 4, 16], help="Concurrent /analyze requests")
+    parser.add_argument("--requests", type=int, default=16, help="/analyze requests sent per concurrency level")
+    parser.add_argument("--request-posts", type=int, default=150, help="Posts per /analyze request")
+    parser.add_argument("--output", default="", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.record:
+        fixtures = asyncio.run(record_fixtures(args.subreddits, args.record_limit, "complain OR issue OR problem"))
+        with open(args.record, "w") as f:
+            json.dump(fixtures, f, indent=2)
+        print(f"Recorded {sum(len(posts) for posts in fixtures.values())} posts to {args.record}")
+        return
+
+    # Configure the app before it is imported: cold caches and the stub LLM server
+    llm_port = _free_port()
+    os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="superred-benchmark-")
+    os.environ["GEMINI_BASE_URL"] = f"http://127.0.0.1:{llm_port}"
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    os.environ["LLM_REQUESTS_PER_MINUTE"] = "0"
+
+    report = asyncio.run(run(args, llm_port))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
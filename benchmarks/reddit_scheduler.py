@@ -0,0 +1,160 @@
+"""
+Benchmark the Reddit rate-limit scheduler against a local fake Reddit
+
+Runs concurrent bulk subreddit fetches (as /analyze does) while interactive
+subreddit searches (as /search-subreddits does) arrive at a steady pace, all
+against FakeRedditServer with a small quota, once with and once without the
+scheduler. Reports the 429s Reddit answered, how the analyses and searches
+ended and the search latency.
+
+Usage:
+    python -m benchmarks.reddit_scheduler --limit 60 --window 30 --analyses 6 \
+        --searches 10 --output reddit_scheduler.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.fakes import FakeRedditServer, synthetic_fixtures
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))]
+
+
+async def run_workload(args: argparse.Namespace, scheduled: bool) -> Dict:
+    """
+    Run the bulk and interactive workload once against a fresh fake Reddit
+    """
+    import asyncpraw
+    import get_data
+    from reddit_scheduler import RedditRateLimited, RedditScheduler, ScheduledRequestor, use_scheduler_pacing
+
+    subreddits = [f"bench{i}" for i in range(args.subreddits)]
+    server = FakeRedditServer(
+        synthetic_fixtures(subreddits, args.posts), limit=args.limit, window=args.window, latency=args.latency
+    )
+    await server.start()
+    # A fresh scheduler that only knows the quota from the fake's headers
+    scheduler = RedditScheduler(limit=args.limit, window=args.window, burst=args.burst, max_wait=args.max_wait)
+    get_data._shared_reddit = asyncpraw.Reddit(
+        client_id="benchmark",
+        client_secret="benchmark",
+        user_agent="superred scheduler benchmark",
+        oauth_url=server.base_url,
+        reddit_url=server.base_url,
+        check_for_updates=False,
+        requestor_class=ScheduledRequestor if scheduled else None,
+        requestor_kwargs={"scheduler": scheduler} if scheduled else None,
+    )
+    if scheduled:
+        use_scheduler_pacing(get_data._shared_reddit)
+    get_data.subreddit_search_cache.clear()
+    get_data.subreddit_metadata_cache.clear()
+
+    analyses: List[Dict] = []
+    searches: List[Dict] = []
+
+    async def analysis() -> None:
+        start = time.perf_counter()
+        failed: Dict[str, str] = {}
+        outcome = "ok"
+        posts = 0
+        try:
+            async for _ in get_data.stream_posts_from_subreddits(
+                subreddits, failed, search_limit=args.posts, use_cache=False
+            ):
+                posts += 1
+        except RedditRateLimited:
+            outcome = "rate_limited"
+        analyses.append({
+            "seconds": time.perf_counter() - start,
+            "posts": posts,
+            "failed_subreddits": len(failed),
+            "outcome": outcome if outcome != "ok" or not failed else "partial",
+        })
+
+    async def search(i: int) -> None:
+        await asyncio.sleep(i * args.search_interval)
+        start = time.perf_counter()
+        try:
+            found = await get_data.find_relevant_subreddits(f"query{i}")
+            outcome = "ok" if found else "empty"
+        except RedditRateLimited:
+            outcome = "rate_limited"
+        searches.append({"seconds": time.perf_counter() - start, "outcome": outcome})
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(analysis() for _ in range(args.analyses)), *(search(i) for i in range(args.searches)))
+    finally:
+        await get_data.close_reddit()
+        await server.stop()
+    seconds = time.perf_counter() - start
+
+    def outcomes(results: List[Dict]) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for result in results:
+            counts[result["outcome"]] = counts.get(result["outcome"], 0) + 1
+        return counts
+
+    search_latencies = [result["seconds"] for result in searches if result["outcome"] == "ok"] or [0.0]
+    return {
+        "scheduler": scheduled,
+        "seconds": round(seconds, 3),
+        "reddit_requests": server.requests,
+        "reddit_429s": server.throttled,
+        "analyses": outcomes(analyses),
+        "analysis_seconds_max": round(max(result["seconds"] for result in analyses), 3),
+        "posts_fetched": sum(result["posts"] for result in analyses),
+        "searches": outcomes(searches),
+        "search_latency_p50": round(statistics.median(search_latencies), 3),
+        "search_latency_p95": round(_percentile(search_latencies, 95), 3),
+    }
+
+
+async def run(args: argparse.Namespace) -> List[Dict]:
+    results = []
+    for scheduled in ([True, False] if args.compare else [True]):
+        result = await run_workload(args, scheduled)
+        results.append(result)
+        print(
+            f"scheduler {'on ' if scheduled else 'off'}: {result['reddit_429s']} Reddit 429s in "
+            f"{result['reddit_requests']} requests, analyses {result['analyses']}, searches {result['searches']}, "
+            f"search p50 {result['search_latency_p50']}s, p95 {result['search_latency_p95']}s"
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=60, help="Requests the fake Reddit allows per window")
+    parser.add_argument("--window", type=float, default=30, help="Seconds per rate-limit window")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds each fake Reddit response takes")
+    parser.add_argument("--analyses", type=int, default=6, help="Concurrent bulk fetches")
+    parser.add_argument("--subreddits", type=int, default=5, help="Subreddits per bulk fetch")
+    parser.add_argument("--posts", type=int, default=200, help="Posts searched per subreddit (100 per request)")
+    parser.add_argument("--searches", type=int, default=10, help="Interactive subreddit searches")
+    parser.add_argument("--search-interval", type=float, default=2.0, help="Seconds between interactive searches")
+    parser.add_argument("--burst", type=int, default=10, help="Tokens the scheduler's bucket holds")
+    parser.add_argument("--max-wait", type=float, default=10, help="Seconds a call may wait in the scheduler")
+    parser.add_argument("--no-compare", dest="compare", action="store_false", help="Only run with the scheduler")
+    parser.add_argument("--output", default="", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    # Keep the post cache of the app out of the measurement
+    os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="superred-benchmark-")
+    results = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
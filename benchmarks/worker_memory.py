@@ -0,0 +1,191 @@
+"""
+Compare memory per API worker with and without the shared model server
+
+Starts the API with uvicorn --workers N twice:
+
+- local: every API worker runs its own clustering pool, and so its own copies
+  of the embedding model
+- shared: one model server (model_server.py) holds the model and the API
+  workers send their jobs to it over MODEL_SERVER_SOCKET
+
+Once /ready answers, the proportional set size (PSS, shared pages split
+between the processes using them) and the RSS of every process in both
+process trees are read from /proc, so this runs on Linux only.
+
+Usage:
+    python -m benchmarks.worker_memory --workers 1 2 4 --output worker_memory.json
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _children() -> Dict[int, List[int]]:
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; fields after it are space separated
+                parent = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+    return children
+
+
+def process_tree(pid: int) -> List[int]:
+    """
+    Return pid and all of its descendants
+    """
+    children = _children()
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+def memory_mb(pids: List[int]) -> Dict[str, float]:
+    """
+    Sum the PSS and RSS of processes in MB
+    """
+    totals = {"pss_mb": 0.0, "rss_mb": 0.0}
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    field, value = line.split(":", 1)[0], line.split()[1:2]
+                    if field == "Pss":
+                        totals["pss_mb"] += int(value[0]) / 1024
+                    elif field == "Rss":
+                        totals["rss_mb"] += int(value[0]) / 1024
+        except (OSError, IndexError, ValueError):
+            # The process exited while the tree was read
+            continue
+    return {name: round(value, 1) for name, value in totals.items()}
+
+
+def wait_until_ready(port: int, workers: int, timeout: float) -> None:
+    """
+    Poll /ready until it answers 200 often enough in a row that every worker has likely warmed up
+    """
+    deadline = time.monotonic() + timeout
+    streak = 0
+    while streak < 3 * workers:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"API not ready after {timeout}s")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=5) as response:
+                streak = streak + 1 if response.status == 200 else 0
+        except (urllib.error.URLError, ConnectionError):
+            streak = 0
+            time.sleep(0.5)
+
+
+def _stop(process: Optional[subprocess.Popen]) -> None:
+    if process is None or process.poll() is not None:
+        return
+    tree = process_tree(process.pid)
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+    # Pool workers of a killed process would otherwise keep running
+    for pid in tree[1:]:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+def measure(mode: str, workers: int, timeout: float, settle: float) -> Dict:
+    """
+    Start the API in mode ("local" or "shared") with workers API workers and measure its memory
+    """
+    port = _free_port()
+    env = dict(os.environ)
+    env.pop("MODEL_SERVER_SOCKET", None)
+    model_server = api = None
+    try:
+        if mode == "shared":
+            env["MODEL_SERVER_SOCKET"] = os.path.join(tempfile.mkdtemp(prefix="superred-model-"), "model.sock")
+            model_server = subprocess.Popen([sys.executable, "model_server.py"], env=env)
+            while not os.path.exists(env["MODEL_SERVER_SOCKET"]):
+                if model_server.poll() is not None:
+                    raise RuntimeError("Model server exited during startup")
+                time.sleep(0.2)
+        api = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+             "--log-level", "warning"],
+            env=env,
+        )
+        wait_until_ready(port, workers, timeout)
+        # Let lazily imported modules and allocator caches settle
+        time.sleep(settle)
+
+        api_memory = memory_mb(process_tree(api.pid))
+        model_memory = memory_mb(process_tree(model_server.pid)) if model_server is not None else {"pss_mb": 0.0, "rss_mb": 0.0}
+        total_pss = api_memory["pss_mb"] + model_memory["pss_mb"]
+        return {
+            "mode": mode,
+            "workers": workers,
+            "api": api_memory,
+            "model_server": model_memory,
+            "total_pss_mb": round(total_pss, 1),
+            "pss_per_worker_mb": round(total_pss / workers, 1),
+        }
+    finally:
+        _stop(api)
+        _stop(model_server)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4], help="API worker counts to measure")
+    parser.add_argument("--modes", nargs="+", choices=["local", "shared"], default=["local", "shared"])
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for /ready")
+    parser.add_argument("--settle", type=float, default=3, help="Seconds to wait after /ready before measuring")
+    parser.add_argument("--output", default="", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        parser.error("Reading memory needs Linux /proc/<pid>/smaps_rollup")
+
+    results = []
+    for workers in args.workers:
+        for mode in args.modes:
+            result = measure(mode, workers, args.timeout, args.settle)
+            results.append(result)
+            print(
+                f"{mode:>6}, {workers} workers: {result['total_pss_mb']} MB PSS in total, "
+                f"{result['pss_per_worker_mb']} MB per worker "
+                f"(API {result['api']['pss_mb']} MB, model server {result['model_server']['pss_mb']} MB)"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
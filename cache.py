@@ -0,0 +1,307 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+class TTLCache:
+    """
+    In-memory LRU cache whose entries expire after a fixed number of seconds
+
+    Args:
+        maxsize: Maximum number of entries kept before the least recently used one is evicted
+        ttl: Seconds an entry stays valid
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Return the cached value for key, or default if it is missing or expired
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store value under key, evicting the least recently used entries if full
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class PersistentCache:
+    """
+    Two-tier cache: an in-memory LRU in front of an SQLite table that survives restarts
+
+    Values must be JSON serializable. Entries expire after ttl seconds in both tiers;
+    the SQLite tier evicts the least recently used entries above disk_maxsize.
+
+    Args:
+        path: SQLite database file
+        maxsize: Maximum number of entries kept in memory
+        disk_maxsize: Maximum number of entries kept on disk
+        ttl: Seconds an entry stays valid
+    """
+
+    # How many writes happen between checks of the on-disk size limit
+    EVICT_EVERY = 100
+
+    def __init__(self, path: str, maxsize: int = 1024, disk_maxsize: int = 100000, ttl: float = 3600.0):
+        self.path = path
+        self.disk_maxsize = disk_maxsize
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Return the cached value for key from memory or disk, or default if missing or expired
+        """
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return default
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return default
+            self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+
+        value = json.loads(row[0])
+        # Promote to memory for the remaining lifetime of the entry
+        self.memory.set(key, value, ttl=row[1] - now)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Store value under key in both tiers
+        """
+        now = time.time()
+        self.memory.set(key, value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + self.ttl, now),
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        if count > self.disk_maxsize:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                (count - self.disk_maxsize,),
+            )
+
+    def clear(self) -> None:
+        self.memory.clear()
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SummaryCache:
+    """
+    Persistent store of cluster summaries keyed by a fingerprint of the cluster members
+
+    Members are stable per-post keys (e.g. content hashes). The namespace separates
+    summaries made by different models or prompt versions. Besides exact lookups,
+    a summary can be reused for a cluster whose membership overlaps a cached one
+    above a Jaccard threshold.
+
+    Args:
+        path: SQLite database file
+        ttl: Seconds a summary stays valid
+    """
+
+    # How many writes happen between removals of expired summaries
+    EVICT_EVERY = 100
+
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600.0):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "fingerprint TEXT PRIMARY KEY, namespace TEXT NOT NULL, size INTEGER NOT NULL, "
+            "value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS summary_members (member TEXT NOT NULL, fingerprint TEXT NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS summary_members_member ON summary_members (member)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS summary_members_fingerprint ON summary_members (fingerprint)")
+
+    @staticmethod
+    def fingerprint(members: Iterable[str], namespace: str) -> str:
+        """
+        Return a key that only depends on the set of members and the namespace
+        """
+        digest = hashlib.sha1(namespace.encode("utf-8"))
+        for member in sorted(set(members)):
+            digest.update(b"\n" + member.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, members: List[str], namespace: str, min_jaccard: float = 1.0) -> Any:
+        """
+        Return the cached summary for members, or None
+
+        Args:
+            members: Keys of the posts in the cluster
+            namespace: Model name and prompt version the summary must come from
+            min_jaccard: Smallest membership overlap accepted for a near match
+                (1.0 only accepts exact matches)
+        """
+        return self.match(members, namespace, min_jaccard)[0]
+
+    def match(self, members: List[str], namespace: str, min_jaccard: float = 1.0) -> Tuple[Any, float]:
+        """
+        Return the cached summary for members with the membership overlap it was found with
+
+        Args:
+            members: Keys of the posts in the cluster
+            namespace: Model name and prompt version the summary must come from
+            min_jaccard: Smallest membership overlap accepted for a near match
+                (1.0 only accepts exact matches)
+
+        Returns:
+            (summary, Jaccard overlap), 1.0 for an exact match, or (None, 0.0)
+        """
+        now = time.time()
+        members = set(members)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM summaries WHERE fingerprint = ? AND expires_at > ?",
+                (self.fingerprint(members, namespace), now),
+            ).fetchone()
+            if row is not None:
+                return json.loads(row[0]), 1.0
+            if min_jaccard >= 1.0 or not members:
+                return None, 0.0
+
+            # Count shared members per cached cluster
+            overlaps: Dict[str, int] = {}
+            member_list = list(members)
+            for i in range(0, len(member_list), 500):
+                chunk = member_list[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for fingerprint, count in self._conn.execute(
+                    f"SELECT fingerprint, COUNT(*) FROM summary_members WHERE member IN ({placeholders}) GROUP BY fingerprint",
+                    chunk,
+                ):
+                    overlaps[fingerprint] = overlaps.get(fingerprint, 0) + count
+
+            best_value, best_score = None, min_jaccard
+            for fingerprint, overlap in overlaps.items():
+                row = self._conn.execute(
+                    "SELECT size, value FROM summaries WHERE fingerprint = ? AND namespace = ? AND expires_at > ?",
+                    (fingerprint, namespace, now),
+                ).fetchone()
+                if row is None:
+                    continue
+                score = overlap / (len(members) + row[0] - overlap)
+                if score >= best_score:
+                    best_value, best_score = row[1], score
+
+        if best_value is None:
+            return None, 0.0
+        return json.loads(best_value), best_score
+
+    def set(self, members: List[str], namespace: str, value: Any) -> None:
+        """
+        Store the summary of the cluster made of members
+        """
+        now = time.time()
+        members = set(members)
+        fingerprint = self.fingerprint(members, namespace)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (fingerprint, namespace, size, value, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (fingerprint, namespace, len(members), json.dumps(value), now + self.ttl),
+            )
+            self._conn.execute("DELETE FROM summary_members WHERE fingerprint = ?", (fingerprint,))
+            self._conn.executemany(
+                "INSERT INTO summary_members (member, fingerprint) VALUES (?, ?)",
+                ((member, fingerprint) for member in members),
+            )
+            self._conn.execute("COMMIT")
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute(
+            "DELETE FROM summary_members WHERE fingerprint IN "
+            "(SELECT fingerprint FROM summaries WHERE expires_at <= ?)",
+            (now,),
+        )
+        self._conn.execute("DELETE FROM summaries WHERE expires_at <= ?", (now,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
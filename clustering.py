@@ -0,0 +1,208 @@
+import os
+from typing import List
+
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Largest corpora handled by the agglomerative and k-means paths; bigger ones use UMAP/HDBSCAN
+CLUSTER_SMALL_MAX = int(os.getenv("CLUSTER_SMALL_MAX", "200"))
+CLUSTER_MEDIUM_MAX = int(os.getenv("CLUSTER_MEDIUM_MAX", "2000"))
+# Average cosine similarity below which clusters are no longer merged
+CLUSTER_SIMILARITY_THRESHOLD = float(os.getenv("CLUSTER_SIMILARITY_THRESHOLD", "0.5"))
+# Clusters with fewer posts are reported as outliers (-1), like BERTopic's min_topic_size
+MIN_CLUSTER_SIZE = int(os.getenv("MIN_CLUSTER_SIZE", "2"))
+
+
+def normalize(embeddings: np.ndarray) -> np.ndarray:
+    """
+    Scale every row to unit length so dot products are cosine similarities
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    return embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+
+def relabel(labels: np.ndarray, min_cluster_size: int = MIN_CLUSTER_SIZE) -> List[int]:
+    """
+    Number clusters from largest (0) to smallest and mark clusters below
+    min_cluster_size as outliers (-1)
+    """
+    ids, counts = np.unique(labels, return_counts=True)
+    order = sorted((-count, cluster_id) for cluster_id, count in zip(ids, counts) if count >= min_cluster_size)
+    mapping = {cluster_id: new_id for new_id, (_, cluster_id) in enumerate(order)}
+    return [mapping.get(label, -1) for label in labels.tolist()]
+
+
+def merge_clusters(similarity: np.ndarray, sizes: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    Average-linkage merging of clusters given their average pairwise similarity
+
+    Repeatedly merges the two most similar clusters until no pair is at least
+    threshold similar.
+
+    Args:
+        similarity: Average cosine similarity between every pair of clusters
+        sizes: Number of documents in every cluster
+        threshold: Minimum average similarity of two clusters to merge them
+
+    Returns:
+        Index of the merged cluster every input cluster ended up in
+    """
+    n = len(sizes)
+    similarity = np.array(similarity, dtype=np.float64)
+    np.fill_diagonal(similarity, -np.inf)
+    sizes = np.asarray(sizes, dtype=np.float64).copy()
+    labels = np.arange(n)
+
+    for _ in range(n - 1):
+        a, b = divmod(int(np.argmax(similarity)), n)
+        if similarity[a, b] < threshold:
+            break
+        # Similarity to the merged cluster is the size-weighted mean
+        merged = (sizes[a] * similarity[a] + sizes[b] * similarity[b]) / (sizes[a] + sizes[b])
+        similarity[a, :] = merged
+        similarity[:, a] = merged
+        similarity[a, a] = -np.inf
+        similarity[b, :] = -np.inf
+        similarity[:, b] = -np.inf
+        sizes[a] += sizes[b]
+        labels[labels == b] = a
+
+    return labels
+
+
+def agglomerative_labels(
+    embeddings: np.ndarray,
+    threshold: float = CLUSTER_SIMILARITY_THRESHOLD,
+    min_cluster_size: int = MIN_CLUSTER_SIZE,
+) -> List[int]:
+    """
+    Average-linkage agglomerative clustering on cosine similarity
+
+    Costs O(n^2) memory and O(n^3) time, so it is meant for small corpora.
+
+    Args:
+        embeddings: Embeddings of the documents
+        threshold: Minimum average cosine similarity of two clusters to merge them
+        min_cluster_size: Smallest cluster not reported as outliers
+
+    Returns:
+        Cluster ID of every document (-1 for outliers)
+    """
+    normed = normalize(embeddings)
+    labels = merge_clusters(normed @ normed.T, np.ones(len(normed)), threshold)
+    return relabel(labels, min_cluster_size)
+
+
+def kmeans_labels(
+    embeddings: np.ndarray,
+    n_clusters: int = 0,
+    threshold: float = CLUSTER_SIMILARITY_THRESHOLD,
+    min_cluster_size: int = MIN_CLUSTER_SIZE,
+    max_iter: int = 50,
+    seed: int = 42,
+) -> List[int]:
+    """
+    Spherical k-means (cosine similarity) with k-means++ initialization
+
+    k is deliberately generous; afterwards, clusters whose average similarity
+    reaches threshold are merged with average linkage, like the agglomerative path.
+
+    Args:
+        embeddings: Embeddings of the documents
+        n_clusters: Number of clusters before merging; 0 picks about sqrt(n / 2)
+        threshold: Minimum average cosine similarity of two clusters to merge them
+        min_cluster_size: Smallest cluster not reported as outliers
+        max_iter: Maximum number of assignment/update rounds
+        seed: Random seed, so repeated runs give the same clusters
+
+    Returns:
+        Cluster ID of every document (-1 for outliers)
+    """
+    n = len(embeddings)
+    normed = normalize(embeddings)
+    k = n_clusters or int(round(np.sqrt(n / 2)))
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+
+    # k-means++ on cosine distance
+    centroids = np.empty((k, normed.shape[1]), dtype=np.float32)
+    centroids[0] = normed[rng.integers(n)]
+    distance = 1.0 - normed @ centroids[0]
+    for i in range(1, k):
+        weights = np.clip(distance, 0, None) ** 2
+        total = weights.sum()
+        index = rng.choice(n, p=weights / total) if total > 0 else rng.integers(n)
+        centroids[i] = normed[index]
+        distance = np.minimum(distance, 1.0 - normed @ centroids[i])
+
+    labels = np.full(n, -1)
+    for _ in range(max_iter):
+        similarity = normed @ centroids.T
+        new_labels = similarity.argmax(axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, normed)
+        counts = np.bincount(labels, minlength=k)
+        # Restart empty clusters at the document farthest from its centroid
+        for i in np.flatnonzero(counts == 0):
+            farthest = int(np.argmin(similarity[np.arange(n), labels]))
+            sums[i] = normed[farthest]
+            similarity[farthest, labels[farthest]] = np.inf
+        centroids = normalize(sums)
+
+    # Average pairwise similarity between clusters is sum_a . sum_b / (n_a * n_b)
+    sums = np.zeros_like(centroids)
+    np.add.at(sums, labels, normed)
+    counts = np.bincount(labels, minlength=k).astype(np.float64)
+    used = np.flatnonzero(counts)
+    similarity = (sums[used] @ sums[used].T) / np.outer(counts[used], counts[used])
+    merged = np.full(k, -1)
+    merged[used] = used[merge_clusters(similarity, counts[used], threshold)]
+    return relabel(merged[labels], min_cluster_size)
+
+
+def cluster_centroids(embeddings: np.ndarray, labels: List[int]) -> np.ndarray:
+    """
+    Return the unit-length centroid of every cluster, row i for cluster i (outliers are left out)
+    """
+    normed = normalize(embeddings)
+    labels = np.asarray(labels)
+    n_clusters = int(labels.max()) + 1 if len(labels) else 0
+    centroids = np.zeros((n_clusters, normed.shape[1]), dtype=np.float32)
+    for cluster in range(n_clusters):
+        centroids[cluster] = normed[labels == cluster].sum(axis=0)
+    return normalize(centroids)
+
+
+def assign_to_centroids(
+    embeddings: np.ndarray,
+    centroids: np.ndarray,
+    threshold: float = CLUSTER_SIMILARITY_THRESHOLD,
+    min_cluster_size: int = MIN_CLUSTER_SIZE,
+) -> List[int]:
+    """
+    Assign every document to its most similar stored centroid instead of clustering again
+
+    Args:
+        embeddings: Embeddings of the documents
+        centroids: Centroids of a previous fit, see cluster_centroids
+        threshold: Documents less similar than this to every centroid are outliers
+        min_cluster_size: Smallest cluster not reported as outliers
+
+    Returns:
+        Cluster ID of every document (-1 for outliers), numbered like kmeans_labels
+    """
+    normed = normalize(embeddings)
+    labels = np.full(len(normed), -1)
+    if not len(centroids):
+        return labels.tolist()
+    similarity = normed @ normalize(centroids).T
+    kept = similarity.max(axis=1) >= threshold
+    if kept.any():
+        labels[kept] = relabel(similarity[kept].argmax(axis=1), min_cluster_size)
+    return labels.tolist()
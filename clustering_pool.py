@@ -0,0 +1,370 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import pickle
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+import metrics
+from posts import Post
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Worker processes for topic modeling and how many extra jobs may wait for one
+CLUSTER_WORKERS = int(os.getenv("CLUSTER_WORKERS", "2"))
+CLUSTER_QUEUE_SIZE = int(os.getenv("CLUSTER_QUEUE_SIZE", "8"))
+# Embedding batches of streaming requests the pool holds at once; they do not count against CLUSTER_QUEUE_SIZE
+CLUSTER_EMBED_JOBS = int(os.getenv("CLUSTER_EMBED_JOBS", "4"))
+# Unix socket of a shared model server (model_server.py); every API worker then uses its pool
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "")
+# Seconds warm-up waits for the model server to start listening
+MODEL_SERVER_CONNECT_TIMEOUT = float(os.getenv("MODEL_SERVER_CONNECT_TIMEOUT", "60"))
+
+
+class PoolSaturatedError(Exception):
+    """Raised when the clustering pool already holds as many jobs as it accepts"""
+
+
+def _init_worker() -> None:
+    """
+    Load the embedding model once when a worker process starts
+    """
+    metrics.configure_logging()
+    try:
+        from utils import get_sentence_transformer
+        get_sentence_transformer()
+    except Exception as e:
+        # The job loads the model again and reports the error to the caller
+        logger.error("Error preloading embedding model: %s", e)
+
+
+def _warmup_job() -> None:
+    """
+    Load the embedding model and run one dummy encode so the first request pays neither
+    """
+    from utils import get_sentence_transformer
+    get_sentence_transformer().encode(["warm up"], show_progress_bar=False)
+
+
+def _embed_job(texts: List[str]) -> List:
+    """
+    Embed texts into the shared embedding store and return the metric updates it made
+    """
+    from utils import embed_texts
+    with metrics.collect() as updates:
+        embed_texts(texts)
+    return updates
+
+
+def _categorize_job(posts_data: List[Post]) -> Tuple[Dict, List]:
+    """
+    Run categorize_posts and return its result with the metric updates it made
+    """
+    from utils import categorize_posts
+    with metrics.collect() as updates:
+        result = categorize_posts(posts_data)
+    return result, updates
+
+
+class ClusteringPool:
+    """
+    Process pool that runs CPU-heavy topic modeling off the event loop
+
+    Background jobs (embedding batches sent while posts are still being
+    fetched) have their own capacity, so a streaming request cannot make
+    the pool turn away other analyses.
+
+    Args:
+        workers: Number of worker processes
+        max_queue: Number of jobs allowed to wait once every worker is busy
+        max_background: Number of background jobs accepted at once
+    """
+
+    def __init__(self, workers: int = CLUSTER_WORKERS, max_queue: int = CLUSTER_QUEUE_SIZE,
+                 max_background: int = CLUSTER_EMBED_JOBS):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.max_background = max(0, max_background)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._background = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of accepted jobs waiting for a free worker"""
+        return max(0, self._pending + self._background - self.workers)
+
+    @property
+    def pending(self) -> int:
+        """Number of accepted jobs that have not finished yet"""
+        return self._pending + self._background
+
+    def start(self) -> None:
+        if self._executor is None:
+            # Spawn instead of fork so workers never inherit torch/tokenizer thread state
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+
+    async def run(self, fn: Callable[..., Any], *args: Any, background: bool = False) -> Any:
+        """
+        Run fn(*args) in a worker process
+
+        Args:
+            fn: Job function
+            args: Arguments of fn
+            background: Count the job against max_background instead of the queue
+
+        Raises:
+            PoolSaturatedError: If every worker is busy and the queue is full,
+                or for a background job if max_background of them are in progress
+        """
+        if background and self._background >= self.max_background:
+            raise PoolSaturatedError(
+                f"Clustering pool is saturated ({self._background} background jobs in progress), try again later"
+            )
+        if not background and self._pending >= self.workers + self.max_queue:
+            raise PoolSaturatedError(
+                f"Clustering pool is saturated ({self._pending} jobs in progress), try again later"
+            )
+
+        self.start()
+        if background:
+            self._background += 1
+        else:
+            self._pending += 1
+        executor = self._executor
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory): stop the broken pool so its threads and surviving
+            # workers exit, and start a fresh one for the next job. Another job failing with the same
+            # pool may have done so already
+            if self._executor is executor:
+                self.shutdown()
+            raise
+        finally:
+            if background:
+                self._background -= 1
+            else:
+                self._pending -= 1
+
+    async def warm_up(self) -> None:
+        """
+        Start every worker process and warm up its embedding model
+        """
+        await asyncio.gather(*(self.run(_warmup_job) for _ in range(self.workers)))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Jobs the model server runs for its clients, by name
+JOBS: Dict[str, Callable[..., Any]] = {
+    "warmup": _warmup_job,
+    "embed": _embed_job,
+    "categorize": _categorize_job,
+}
+_JOB_NAMES = {fn: name for name, fn in JOBS.items()}
+_FRAME_HEADER = struct.Struct("!I")
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Any:
+    """
+    Read one length-prefixed pickled message
+
+    Raises:
+        asyncio.IncompleteReadError: If the connection closes mid-message
+    """
+    header = await reader.readexactly(_FRAME_HEADER.size)
+    (length,) = _FRAME_HEADER.unpack(header)
+    return pickle.loads(await reader.readexactly(length))
+
+
+async def write_frame(writer: asyncio.StreamWriter, message: Any) -> None:
+    """
+    Write one message as a length-prefixed pickle
+    """
+    payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    writer.write(_FRAME_HEADER.pack(len(payload)) + payload)
+    await writer.drain()
+
+
+class RemoteClusteringPool:
+    """
+    Send clustering pool jobs to the shared model server over a Unix socket
+
+    Has the same interface as ClusteringPool, so with several API workers
+    the embedding model is loaded once, in the model server's pool, instead
+    of once per API worker. Requests are multiplexed over one connection
+    per worker and matched to their responses by ID.
+
+    Args:
+        path: Unix socket the model server listens on
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._responses: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count()
+        self._pending = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Jobs wait in the model server, which reports its own queue"""
+        return 0
+
+    @property
+    def pending(self) -> int:
+        """Number of jobs sent by this worker that have not finished yet"""
+        return self._pending
+
+    def start(self) -> None:
+        # Connects on the first job, so the model server may start after the API
+        pass
+
+    async def _connect(self) -> None:
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+            self._write_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return
+            self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+            self._read_task = asyncio.create_task(self._read_responses(self._reader))
+
+    async def _read_responses(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                response = await read_frame(reader)
+                future = self._responses.pop(response["id"], None)
+                if future is None or future.done():
+                    continue
+                if "error" not in response:
+                    future.set_result(response["result"])
+                elif response.get("saturated"):
+                    future.set_exception(PoolSaturatedError(response["error"]))
+                else:
+                    future.set_exception(RuntimeError(response["error"]))
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            logger.error("Lost connection to model server: %s", e)
+        finally:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            # The next job reconnects; jobs still waiting will not get an answer
+            for future in self._responses.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Lost connection to model server"))
+            self._responses.clear()
+
+    async def run(self, fn: Callable[..., Any], *args: Any, background: bool = False) -> Any:
+        """
+        Run fn(*args) in the model server's pool
+
+        The model server runs embedding jobs, the only background ones, as
+        background jobs itself, so background is only part of the interface.
+
+        Raises:
+            PoolSaturatedError: If the model server's pool is saturated
+            ConnectionError: If the model server cannot be reached
+        """
+        await self._connect()
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._responses[request_id] = future
+        self._pending += 1
+        try:
+            async with self._write_lock:
+                await write_frame(self._writer, {"id": request_id, "job": _JOB_NAMES[fn], "args": args})
+            return await future
+        finally:
+            self._pending -= 1
+            self._responses.pop(request_id, None)
+
+    async def warm_up(self) -> None:
+        """
+        Wait until the model server is up and has warmed up its workers
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + MODEL_SERVER_CONNECT_TIMEOUT
+        while True:
+            try:
+                await self._connect()
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if loop.time() >= deadline:
+                    raise
+                await asyncio.sleep(0.5)
+        await self.run(_warmup_job)
+
+    def shutdown(self) -> None:
+        if self._read_task is not None:
+            self._read_task.cancel()
+            self._read_task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+clustering_pool = RemoteClusteringPool(MODEL_SERVER_SOCKET) if MODEL_SERVER_SOCKET else ClusteringPool()
+metrics.Gauge(
+    "superred_cluster_pool_queue_depth", "Clustering jobs waiting for a free worker",
+    function=lambda: clustering_pool.queue_depth,
+)
+metrics.Gauge(
+    "superred_cluster_pool_pending", "Clustering jobs accepted and not finished",
+    function=lambda: clustering_pool.pending,
+)
+
+
+async def categorize_posts_async(posts_data: List[Post]) -> Dict:
+    """
+    Run categorize_posts in the clustering pool without blocking the event loop
+
+    Args:
+        posts_data: Posts from Reddit
+
+    Returns:
+        Dict of post clusters keyed by cluster ID
+    """
+    result, updates = await clustering_pool.run(_categorize_job, posts_data)
+    # Worker processes have their own registries; count their updates here
+    metrics.apply(updates)
+    return result
+
+
+async def embed_texts_async(texts: List[str]) -> None:
+    """
+    Embed texts in the clustering pool so later jobs find them in the embedding store
+
+    Runs as a background job; when those are saturated the texts are embedded
+    later by the clustering job instead.
+
+    Args:
+        texts: Texts to embed
+
+    Raises:
+        PoolSaturatedError: If the pool's background capacity is used up
+    """
+    updates = await clustering_pool.run(_embed_job, texts, background=True)
+    metrics.apply(updates)
@@ -0,0 +1,65 @@
+import os
+from typing import Any
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Embedding runtime: "torch" (fp32 PyTorch), "onnx" (ONNX Runtime) or "onnx-int8" (quantized ONNX)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+# Quantized ONNX file of the model repository used by the onnx-int8 backend
+EMBEDDING_ONNX_INT8_FILE = os.getenv("EMBEDDING_ONNX_INT8_FILE", "model_qint8_avx2.onnx")
+# CPU threads used for encoding (0 keeps the runtime default)
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+# Tokens kept per text (0 keeps the model default); shorter is faster on long posts
+EMBEDDING_MAX_SEQ_LENGTH = int(os.getenv("EMBEDDING_MAX_SEQ_LENGTH", "0"))
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def load_embedding_model(
+    model_name: str,
+    backend: str = EMBEDDING_BACKEND,
+    threads: int = EMBEDDING_THREADS,
+    max_seq_length: int = EMBEDDING_MAX_SEQ_LENGTH,
+) -> Any:
+    """
+    Load a SentenceTransformer model with the given runtime backend
+
+    The ONNX backends need `optimum[onnxruntime]`. onnx-int8 loads the quantized
+    file EMBEDDING_ONNX_INT8_FILE shipped in the model repository.
+
+    Args:
+        model_name: SentenceTransformer model name or path
+        backend: One of BACKENDS
+        threads: CPU threads used for encoding (0 keeps the runtime default)
+        max_seq_length: Tokens kept per text (0 keeps the model default)
+
+    Returns:
+        A SentenceTransformer instance
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        model = SentenceTransformer(model_name)
+    elif backend in ("onnx", "onnx-int8"):
+        model_kwargs = {"provider": "CPUExecutionProvider"}
+        if threads:
+            import onnxruntime as ort
+            session_options = ort.SessionOptions()
+            session_options.intra_op_num_threads = threads
+            session_options.inter_op_num_threads = 1
+            model_kwargs["session_options"] = session_options
+        if backend == "onnx-int8":
+            model_kwargs["file_name"] = EMBEDDING_ONNX_INT8_FILE
+        model = SentenceTransformer(model_name, backend="onnx", model_kwargs=model_kwargs)
+    else:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+
+    if max_seq_length:
+        model.max_seq_length = max_seq_length
+    return model
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, List, Optional, Set
+
+from dotenv import load_dotenv
+
+from embedding_store import text_hash
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Embed posts while they are still being fetched
+PIPELINE_EMBEDDING = os.getenv("PIPELINE_EMBEDDING", "true").lower() in ("1", "true", "yes")
+# A batch is sent once it holds this many texts, or this many seconds after its first text arrived
+PIPELINE_EMBED_BATCH_SIZE = int(os.getenv("PIPELINE_EMBED_BATCH_SIZE", "64"))
+PIPELINE_EMBED_FLUSH_INTERVAL = float(os.getenv("PIPELINE_EMBED_FLUSH_INTERVAL", "0.25"))
+# Batches of one request encoded at the same time
+PIPELINE_EMBED_MAX_IN_FLIGHT = int(os.getenv("PIPELINE_EMBED_MAX_IN_FLIGHT", "2"))
+
+
+class MicroBatchEmbedder:
+    """
+    Collect texts as they stream in and embed them in batches, flushed on size or time
+
+    While max_in_flight batches are running, new texts keep accumulating and are
+    sent as one batch when a running batch finishes. Failed batches are only
+    logged: texts that were not embedded are encoded later by whoever needs them.
+
+    Args:
+        embed: Coroutine function embedding a list of texts
+        batch_size: Number of texts that triggers a flush
+        flush_interval: Seconds after which a partial batch is flushed
+        max_in_flight: Maximum number of batches being embedded at the same time
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[List[str]], Awaitable[Any]],
+        batch_size: int = PIPELINE_EMBED_BATCH_SIZE,
+        flush_interval: float = PIPELINE_EMBED_FLUSH_INTERVAL,
+        max_in_flight: int = PIPELINE_EMBED_MAX_IN_FLIGHT,
+    ):
+        self.embed = embed
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_in_flight = max(1, max_in_flight)
+        self.batches = 0
+        self._buffer: List[str] = []
+        self._seen: Set[str] = set()
+        self._in_flight: Set[asyncio.Task] = set()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def add(self, text: str) -> None:
+        """
+        Queue a text for embedding; texts already queued are skipped
+        """
+        key = text_hash(text)
+        if key in self._seen:
+            return
+        self._seen.add(key)
+        self._buffer.append(text)
+        if len(self._buffer) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._flush)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffer or len(self._in_flight) >= self.max_in_flight:
+            # Sent when a running batch finishes
+            return
+        batch, self._buffer = self._buffer, []
+        self.batches += 1
+        task = asyncio.create_task(self._run(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._batch_done)
+
+    async def _run(self, batch: List[str]) -> None:
+        try:
+            await self.embed(batch)
+        except Exception as e:
+            logger.warning("Error embedding a batch of %d texts: %s", len(batch), e)
+
+    def _batch_done(self, task: asyncio.Task) -> None:
+        self._in_flight.discard(task)
+        self._flush()
+
+    async def close(self) -> None:
+        """
+        Embed the remaining texts and wait for every batch to finish
+        """
+        while self._buffer or self._in_flight:
+            self._flush()
+            if self._in_flight:
+                await asyncio.wait(set(self._in_flight))
+
+    def cancel(self) -> None:
+        """
+        Drop queued texts and stop waiting for running batches
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._buffer = []
+        for task in list(self._in_flight):
+            task.cancel()
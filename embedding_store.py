@@ -0,0 +1,127 @@
+import fcntl
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, Iterable, List, Sequence
+
+import numpy as np
+
+
+def text_hash(text: str) -> str:
+    """
+    Return the key used to store the embedding of a text
+    """
+    return hashlib.sha1(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Append-only store of text embeddings keyed by a hash of the text
+
+    Vectors are appended to a raw float16/float32 file that is read back through a
+    NumPy memory map; an SQLite index maps each text hash to its row. Appends are
+    serialized with a file lock, so several processes can share one store.
+
+    Args:
+        directory: Directory holding the vector file and the index
+        dim: Embedding dimension
+        dtype: Storage dtype of the vectors ("float16" or "float32")
+    """
+
+    def __init__(self, directory: str, dim: int, dtype: str = "float16"):
+        self.directory = directory
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.row_bytes = self.dim * self.dtype.itemsize
+        os.makedirs(directory, exist_ok=True)
+
+        self.data_path = os.path.join(directory, f"embeddings.{self.dtype.name}.bin")
+        self.lock_path = os.path.join(directory, "embeddings.lock")
+        self._conn = sqlite3.connect(
+            os.path.join(directory, f"index.{self.dtype.name}.sqlite3"),
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (hash TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self._lock = threading.Lock()
+        self._mmap = None
+
+    def _lookup(self, hashes: Iterable[str]) -> Dict[str, int]:
+        hashes = list(hashes)
+        rows = {}
+        # Stay below SQLite's limit on query parameters
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows.update(self._conn.execute(
+                f"SELECT hash, row FROM embeddings WHERE hash IN ({placeholders})", chunk
+            ).fetchall())
+        return rows
+
+    def _append(self, hashes: List[str], vectors: np.ndarray) -> Dict[str, int]:
+        with open(self.lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Another process may have stored some of these in the meantime
+                rows = self._lookup(hashes)
+                new = [i for i, h in enumerate(hashes) if h not in rows]
+                if not new:
+                    return rows
+
+                # Drop a partial row left behind by an interrupted write
+                size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+                if size % self.row_bytes:
+                    os.truncate(self.data_path, size - size % self.row_bytes)
+
+                with open(self.data_path, "ab") as data_file:
+                    start = data_file.tell() // self.row_bytes
+                    data_file.write(np.ascontiguousarray(vectors[new], dtype=self.dtype).tobytes())
+
+                new_rows = {hashes[i]: start + offset for offset, i in enumerate(new)}
+                self._conn.execute("BEGIN")
+                self._conn.executemany("INSERT OR IGNORE INTO embeddings (hash, row) VALUES (?, ?)", new_rows.items())
+                self._conn.execute("COMMIT")
+                rows.update(new_rows)
+                return rows
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _matrix(self, min_rows: int) -> np.ndarray:
+        # Remap only when the file has grown past the current view
+        if self._mmap is None or self._mmap.shape[0] < min_rows:
+            rows = os.path.getsize(self.data_path) // self.row_bytes
+            self._mmap = np.memmap(self.data_path, dtype=self.dtype, mode="r", shape=(rows, self.dim))
+        return self._mmap
+
+    def get_or_encode(self, texts: Sequence[str], encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Return embeddings for texts, encoding only the ones not stored yet
+
+        Args:
+            texts: Texts to embed
+            encode: Function that embeds a list of texts in one batch
+
+        Returns:
+            float32 array of shape (len(texts), dim)
+        """
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+
+        hashes = [text_hash(text) for text in texts]
+        with self._lock:
+            rows = self._lookup(set(hashes))
+            missing = list(dict.fromkeys(h for h in hashes if h not in rows))
+            if missing:
+                text_by_hash = dict(zip(hashes, texts))
+                vectors = np.asarray(encode([text_by_hash[h] for h in missing]), dtype=np.float32)
+                rows.update(self._append(missing, vectors))
+
+            indices = [rows[h] for h in hashes]
+            matrix = self._matrix(max(indices) + 1)
+            return np.asarray(matrix[indices], dtype=np.float32)
+
+    def __len__(self) -> int:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return count
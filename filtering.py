@@ -0,0 +1,167 @@
+import os
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from embedding_store import text_hash
+from posts import Post
+from metrics import posts_filtered_total
+
+# Load environment variables
+load_dotenv()
+
+# What to do with posts without a body (link/image posts): "backfill" uses the title, "drop" removes them
+FILTER_EMPTY_BODY = os.getenv("FILTER_EMPTY_BODY", "backfill")
+FILTER_CROSSPOSTS = os.getenv("FILTER_CROSSPOSTS", "true").lower() in ("1", "true", "yes")
+# Estimated Jaccard similarity of word shingles above which two posts are near-duplicates (1 disables)
+FILTER_NEAR_DUPLICATE_THRESHOLD = float(os.getenv("FILTER_NEAR_DUPLICATE_THRESHOLD", "0.8"))
+
+# Bodies Reddit leaves behind for moderated or deleted posts
+EMPTY_BODIES = {"", "[removed]", "[deleted]"}
+
+# MinHash signature size and LSH banding (16 bands of 4 rows finds pairs from about 0.5 similarity)
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+SHINGLE_SIZE = 3
+_MERSENNE_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(1)
+_HASH_A = _rng.integers(1, _MERSENNE_PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_HASH_B = _rng.integers(0, _MERSENNE_PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+
+def has_body(post: Post) -> bool:
+    return post.content.strip() not in EMPTY_BODIES
+
+
+def post_text(post: Post) -> str:
+    """
+    Return the text a post is embedded and clustered on: its body, or its title if it has none
+    """
+    return post.content if has_body(post) else post.title
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def drop_reason(post: Post) -> Optional[str]:
+    """
+    Return why filter_posts removes a post on its own merits ("crossposts" or "empty_dropped"), or None
+
+    Cheap enough to run on every post as it is fetched.
+    """
+    if FILTER_CROSSPOSTS and post.is_crosspost:
+        return "crossposts"
+    if not has_body(post) and (FILTER_EMPTY_BODY == "drop" or not post.title.strip()):
+        return "empty_dropped"
+    return None
+
+
+def duplicate_key(post: Post) -> str:
+    """
+    Return a key that is equal for posts filter_posts treats as exact duplicates
+    """
+    return text_hash(_normalize_text(f"{post.title}\n{post_text(post)}"))
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """
+    MinHash signature of the word shingles of text
+    """
+    words = text.split()
+    if len(words) < SHINGLE_SIZE:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode("utf-8")) % _MERSENNE_PRIME for shingle in set(shingles)),
+        dtype=np.uint64,
+    )
+    return ((_HASH_A[:, None] * hashes[None, :] + _HASH_B[:, None]) % _MERSENNE_PRIME).min(axis=1)
+
+
+def find_near_duplicates(texts: List[str], threshold: float = FILTER_NEAR_DUPLICATE_THRESHOLD) -> List[int]:
+    """
+    Find texts that nearly duplicate an earlier text, using MinHash and LSH
+
+    Candidate pairs share at least one LSH band; a candidate is a duplicate when
+    the share of equal signature values (the Jaccard estimate) reaches threshold.
+
+    Args:
+        texts: Normalized texts
+        threshold: Minimum estimated Jaccard similarity of word shingles
+
+    Returns:
+        Indices of texts to drop (the first text of each group is kept)
+    """
+    if not texts:
+        return []
+    signatures = np.stack([minhash_signature(text) for text in texts])
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+
+    buckets = defaultdict(list)
+    for band in range(LSH_BANDS):
+        band_values = signatures[:, band * rows:(band + 1) * rows]
+        for i, values in enumerate(band_values):
+            buckets[(band, values.tobytes())].append(i)
+
+    duplicates = np.zeros(len(texts), dtype=bool)
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        members = np.array(members)
+        for position, i in enumerate(members[:-1]):
+            if duplicates[i]:
+                continue
+            # Compare against the later members of the bucket at once
+            candidates = members[position + 1:]
+            candidates = candidates[~duplicates[candidates]]
+            similar = (signatures[candidates] == signatures[i]).mean(axis=1) >= threshold
+            duplicates[candidates[similar]] = True
+    return np.flatnonzero(duplicates).tolist()
+
+
+def filter_posts(posts: List[Post]) -> Tuple[List[Post], Dict[str, int]]:
+    """
+    Remove posts that would only add noise to clustering and summarization
+
+    Drops crossposts, posts without a body when FILTER_EMPTY_BODY is "drop"
+    (otherwise they are clustered on their title), exact duplicates and near-duplicate
+    reposts. The first occurrence of duplicated content is kept.
+
+    Args:
+        posts: Posts to filter
+
+    Returns:
+        Tuple of (kept posts, counts of removed and backfilled posts by reason)
+    """
+    stats = {"crossposts": 0, "empty_dropped": 0, "empty_backfilled": 0, "exact_duplicates": 0, "near_duplicates": 0}
+    kept = []
+    seen = set()
+    for post in posts:
+        reason = drop_reason(post)
+        if reason is not None:
+            stats[reason] += 1
+            continue
+        if not has_body(post):
+            stats["empty_backfilled"] += 1
+        key = duplicate_key(post)
+        if key in seen:
+            stats["exact_duplicates"] += 1
+            continue
+        seen.add(key)
+        kept.append(post)
+
+    if FILTER_NEAR_DUPLICATE_THRESHOLD < 1.0:
+        duplicates = set(find_near_duplicates([_normalize_text(post_text(post)) for post in kept]))
+        stats["near_duplicates"] = len(duplicates)
+        kept = [post for i, post in enumerate(kept) if i not in duplicates]
+
+    for reason, count in stats.items():
+        if reason != "empty_backfilled":
+            posts_filtered_total.inc(count, reason=reason)
+    return kept, stats
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from metrics import Gauge
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Concurrent pipeline runs, jobs allowed to wait for one, and how long results are kept
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "3600"))
+
+
+class JobQueueFullError(Exception):
+    """Raised when no more jobs can be queued"""
+
+
+@dataclass
+class Job:
+    id: str
+    key: str
+    status: str = "queued"  # queued, running, succeeded or failed
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+
+class JobManager:
+    """
+    In-process job queue with a bounded pool of worker tasks
+
+    Jobs are identified by a key built from their normalized parameters. While a
+    job is queued or running, submitting the same key returns that job instead
+    of starting another run (single-flight).
+
+    Args:
+        workers: Number of jobs run at the same time
+        max_queue: Number of jobs allowed to wait for a worker
+        result_ttl: Seconds finished jobs stay available
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_queue: int = JOB_QUEUE_SIZE, result_ttl: float = JOB_RESULT_TTL):
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+        self._jobs: Dict[str, Job] = {}
+        self._in_flight: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def submit(self, key: str, run: Callable[[], Awaitable[Any]]) -> Job:
+        """
+        Queue run() as a job, or return the in-flight job with the same key
+
+        Raises:
+            JobQueueFullError: If the queue is full
+        """
+        self._prune()
+        job = self._in_flight.get(key)
+        if job is not None:
+            return job
+
+        if self._queue is None:
+            self.start()
+        job = Job(id=uuid.uuid4().hex, key=key)
+        try:
+            self._queue.put_nowait((job, run))
+        except asyncio.QueueFull:
+            raise JobQueueFullError(f"Job queue is full ({self.max_queue} jobs waiting), try again later")
+        self._jobs[job.id] = job
+        self._in_flight[key] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job, run = await self._queue.get()
+            job.status = "running"
+            try:
+                job.result = await run()
+                job.status = "succeeded"
+            except Exception as e:
+                logger.error("Error running job %s: %s", job.id, e)
+                job.error = str(e) or type(e).__name__
+                job.status = "failed"
+            finally:
+                job.finished_at = time.time()
+                self._in_flight.pop(job.key, None)
+                self._queue.task_done()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+job_manager = JobManager()
+Gauge(
+    "superred_job_queue_depth", "Analysis jobs waiting for a job worker",
+    function=lambda: job_manager.queue_depth,
+)
@@ -0,0 +1,178 @@
+import math
+import os
+import re
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from filtering import has_body
+from posts import Post
+
+# Load environment variables
+load_dotenv()
+
+# Keywords joined into a fast-mode category label, and sentences in its pain point summary
+FAST_LABEL_KEYWORDS = int(os.getenv("FAST_LABEL_KEYWORDS", "4"))
+FAST_SUMMARY_SENTENCES = int(os.getenv("FAST_SUMMARY_SENTENCES", "2"))
+# Most representative posts of a cluster whose sentences may be picked for its summary
+FAST_SUMMARY_POSTS = int(os.getenv("FAST_SUMMARY_POSTS", "5"))
+
+# Sentences outside this length (in characters) rarely make a readable summary on their own
+MIN_SENTENCE_CHARS = 20
+MAX_SENTENCE_CHARS = 300
+# Share of words a summary sentence may have in common with one already chosen
+MAX_SENTENCE_OVERLAP = 0.6
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def _vectorizer():
+    # Deferred so importing this module stays cheap
+    from sklearn.feature_extraction.text import CountVectorizer
+    return CountVectorizer(stop_words="english", ngram_range=(1, 2), token_pattern=r"(?u)\b[a-zA-Z][a-zA-Z]+\b")
+
+
+def ctfidf_keywords(cluster_docs: Dict[Any, List[str]], top_n: int = 10) -> Dict[Any, List[Tuple[str, float]]]:
+    """
+    Rank the words of every cluster by class-based TF-IDF, as BERTopic labels its topics
+
+    All documents of a cluster are treated as one; a term's frequency in the
+    cluster is weighted by log(1 + average words per cluster / frequency of
+    the term across all clusters).
+
+    Args:
+        cluster_docs: Documents keyed by cluster ID
+        top_n: Number of keywords kept per cluster
+
+    Returns:
+        (keyword, weight) pairs keyed by cluster ID, highest weight first
+    """
+    clusters = [cluster for cluster, docs in cluster_docs.items() if docs]
+    if not clusters:
+        return {}
+    vectorizer = _vectorizer()
+    try:
+        counts = vectorizer.fit_transform([" ".join(cluster_docs[cluster]) for cluster in clusters])
+    except ValueError:
+        # Nothing but stop words
+        return {cluster: [] for cluster in clusters}
+
+    counts = counts.toarray().astype(np.float64)
+    frequency = counts.sum(axis=0)
+    average_words = max(counts.sum(axis=1).mean(), 1.0)
+    idf = np.log(1 + average_words / np.maximum(frequency, 1))
+    tf = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    weights = tf * idf
+
+    terms = vectorizer.get_feature_names_out()
+    keywords = {}
+    for row, cluster in enumerate(clusters):
+        ranked = np.argsort(-weights[row], kind="stable")[:top_n]
+        keywords[cluster] = [(str(terms[i]), float(weights[row, i])) for i in ranked if weights[row, i] > 0]
+    return keywords
+
+
+def keyword_label(keywords: List[Tuple[str, float]], max_keywords: int = FAST_LABEL_KEYWORDS) -> str:
+    """
+    Join the top keywords of a cluster into a label
+
+    A phrase replaces the chosen words it contains ("battery drain" replaces
+    "battery"); other keywords sharing a word with a chosen one are skipped.
+    """
+    chosen: List[str] = []
+    for keyword, _ in keywords:
+        words = set(keyword.split())
+        contained = [i for i, other in enumerate(chosen) if set(other.split()) < words]
+        if contained and all(set(other.split()) < words or not words & set(other.split()) for other in chosen):
+            # The phrase takes the place of the first word it contains
+            chosen[contained[0]] = keyword
+            chosen = [other for i, other in enumerate(chosen) if i not in contained[1:]]
+        elif len(chosen) < max_keywords and not any(words & set(other.split()) for other in chosen):
+            chosen.append(keyword)
+    return ", ".join(chosen).capitalize() if chosen else "Uncategorized"
+
+
+def _document(post: Post) -> str:
+    return f"{post.title}\n{post.content}" if has_body(post) else post.title
+
+
+def _sentences(post: Post) -> List[str]:
+    sentences = []
+    for sentence in _SENTENCE_BREAK.split(_document(post)):
+        sentence = " ".join(sentence.split())
+        if MIN_SENTENCE_CHARS <= len(sentence) <= MAX_SENTENCE_CHARS:
+            sentences.append(sentence)
+    return sentences
+
+
+def extractive_summary(
+    posts: List[Post],
+    keywords: List[Tuple[str, float]],
+    max_sentences: int = FAST_SUMMARY_SENTENCES,
+    max_posts: int = FAST_SUMMARY_POSTS,
+) -> str:
+    """
+    Summarize a cluster with the sentences of its most representative posts that best cover its keywords
+
+    Args:
+        posts: Posts in the cluster, most representative first
+        keywords: c-TF-IDF keywords of the cluster, see ctfidf_keywords
+        max_sentences: Number of sentences in the summary
+        max_posts: Number of leading posts whose sentences are considered
+
+    Returns:
+        The chosen sentences, best first
+    """
+    weights = dict(keywords)
+    analyzer = _vectorizer().build_analyzer()
+    scored = []
+    for rank, post in enumerate(posts[:max_posts]):
+        for sentence in _sentences(post):
+            terms = analyzer(sentence)
+            if not terms:
+                continue
+            # Keyword weight per term, so long sentences do not win by length alone;
+            # ties go to sentences of more representative posts
+            score = sum(weights.get(term, 0.0) for term in set(terms)) / math.sqrt(len(terms))
+            scored.append((-score, rank, sentence, {term for term in terms if " " not in term}))
+    scored.sort(key=lambda item: (item[0], item[1]))
+
+    chosen, chosen_words = [], []
+    for _, _, sentence, words in scored:
+        if len(chosen) == max_sentences:
+            break
+        # Skip sentences that repeat one already chosen
+        if any(len(words & other) > MAX_SENTENCE_OVERLAP * min(len(words), len(other)) for other in chosen_words):
+            continue
+        chosen.append(sentence)
+        chosen_words.append(words)
+    if not chosen:
+        return "No clear pain points identified."
+    return " ".join(sentence if sentence[-1] in ".!?" else sentence + "." for sentence in chosen)
+
+
+def label_clusters(categorized_posts: Dict) -> Dict[Any, Dict]:
+    """
+    Name and summarize every cluster without an LLM, from its c-TF-IDF keywords and representative sentences
+
+    Outliers (cluster -1) take part in weighting the keywords but are not labeled.
+
+    Args:
+        categorized_posts: Dict of post clusters keyed by cluster ID, most representative posts first
+
+    Returns:
+        Dict of categories with summaries keyed by cluster ID, shaped like those of utils.summarize_pain_points
+    """
+    keywords = ctfidf_keywords({
+        cluster: [_document(post) for post in posts]
+        for cluster, posts in categorized_posts.items()
+    })
+    return {
+        cluster: {
+            'category': keyword_label(keywords.get(cluster, [])),
+            'pain_points': extractive_summary(posts, keywords.get(cluster, [])),
+            'posts': posts,
+        }
+        for cluster, posts in categorized_posts.items()
+        if cluster != -1
+    }
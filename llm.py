@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from metrics import llm_requests_total, llm_tokens_total, upstream_seconds
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-lite")
+# Point the client at another endpoint, e.g. a local fake LLM server in tests
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+
+# Limits shared by every summarization call in the process
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "5"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "1"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "20"))
+
+# Rate limiting and server errors are worth retrying, other client errors are not
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+@lru_cache(maxsize=1)
+def get_genai_client():
+    """
+    Return the Gemini client shared by all summarization calls
+    """
+    from google import genai
+
+    http_options = {"base_url": GEMINI_BASE_URL} if GEMINI_BASE_URL else None
+    return genai.Client(api_key=GEMINI_API_KEY, http_options=http_options)
+
+
+class RateLimiter:
+    """
+    Limit how many LLM calls run at once and how many start per minute
+
+    Args:
+        max_concurrency: Maximum number of calls in flight
+        requests_per_minute: Maximum number of calls started per minute (0 disables the limit)
+    """
+
+    def __init__(self, max_concurrency: int = LLM_CONCURRENCY, requests_per_minute: float = LLM_REQUESTS_PER_MINUTE):
+        self.max_concurrency = max(1, max_concurrency)
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next_start = 0.0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Semaphores belong to one event loop; recreate it if the loop changed
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def _wait_for_turn(self) -> None:
+        now = time.monotonic()
+        start = max(now, self._next_start)
+        self._next_start = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    @asynccontextmanager
+    async def slot(self):
+        async with self._get_semaphore():
+            await self._wait_for_turn()
+            yield
+
+
+llm_limiter = RateLimiter()
+
+
+def _is_retryable(error: Exception) -> bool:
+    from google.genai import errors
+
+    if isinstance(error, errors.APIError):
+        return error.code in RETRY_STATUS_CODES
+    return isinstance(error, httpx.TransportError)
+
+
+async def generate_json(
+    prompt: str,
+    response_schema: Any,
+    model: str = GEMINI_MODEL,
+    max_retries: int = LLM_MAX_RETRIES,
+) -> Any:
+    """
+    Ask the LLM for a JSON response matching response_schema
+
+    Calls go through llm_limiter and are retried with exponential backoff and
+    full jitter on rate limiting, server errors and connection failures.
+
+    Args:
+        prompt: Prompt text
+        response_schema: Pydantic model (or schema) the response must follow
+        model: Gemini model name
+        max_retries: Number of retries after the first attempt
+
+    Returns:
+        The GenerateContentResponse of the successful attempt
+    """
+    client = get_genai_client()
+    for attempt in range(max_retries + 1):
+        try:
+            async with llm_limiter.slot():
+                start = time.perf_counter()
+                try:
+                    response = await client.aio.models.generate_content(
+                        model=model,
+                        contents=prompt,
+                        config={
+                            'response_mime_type': 'application/json',
+                            'response_schema': response_schema,
+                        },
+                    )
+                finally:
+                    upstream_seconds.observe(time.perf_counter() - start, service="gemini")
+        except Exception as e:
+            if attempt == max_retries or not _is_retryable(e):
+                llm_requests_total.inc(outcome="error")
+                raise
+            llm_requests_total.inc(outcome="retry")
+            delay = random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+            logger.warning("LLM call failed (%s), retrying in %.1fs", e, delay)
+            await asyncio.sleep(delay)
+        else:
+            llm_requests_total.inc(outcome="success")
+            usage = getattr(response, "usage_metadata", None)
+            if usage is not None:
+                llm_tokens_total.inc(usage.prompt_token_count or 0, type="prompt")
+                llm_tokens_total.inc(usage.candidates_token_count or 0, type="completion")
+            return response
@@ -1,27 +1,127 @@
-from fastapi import FastAPI, HTTPException
-from typing import List, Optional
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+import orjson
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional
 from pydantic import BaseModel
-from utils import categorize_posts, summarize_pain_points
-from get_data import get_posts_from_subreddits, find_relevant_subreddits
+from utils import iter_pain_point_summaries
+from keywords import ctfidf_keywords, label_clusters
+from clustering_pool import clustering_pool, categorize_posts_async, embed_texts_async, PoolSaturatedError
+from embedding_batcher import MicroBatchEmbedder, PIPELINE_EMBEDDING
+from jobs import job_manager, JobQueueFullError
+from get_data import stream_posts_from_subreddits, order_by_subreddit, find_relevant_subreddits, get_reddit, close_reddit
+from reddit_scheduler import RedditRateLimited
+from filtering import drop_reason, duplicate_key, filter_posts, post_text
+from metrics import configure_logging, registry, request_seconds, server_timing, timed, track_request, SERVER_TIMING_HEADER
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# Responses at least this large are gzip-compressed for clients that accept it
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1000"))
+
+# Load the embedding model in every clustering worker before reporting ready
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+warmup_state = {"ready": not WARMUP_ON_STARTUP, "error": None}
+
+async def warm_up():
+    """
+    Warm up the clustering workers and mark the app ready once they are
+    """
+    try:
+        start = time.monotonic()
+        await clustering_pool.warm_up()
+        # Import the keyword vectorizer so the first fast-mode request does not pay for it
+        await asyncio.to_thread(ctfidf_keywords, {0: ["warm up"]})
+        warmup_state["ready"] = True
+        logger.info("Warm-up finished in %.1fs", time.monotonic() - start)
+    except Exception as e:
+        warmup_state["error"] = str(e) or type(e).__name__
+        logger.error("Error during warm-up: %s", warmup_state['error'])
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start the shared Reddit client, clustering pool and job workers, and stop them on shutdown
+    
+    Warm-up runs in the background so /health answers while models load;
+    /ready reports when it has finished.
+    """
+    try:
+        await get_reddit()
+    except Exception as e:
+        # Requests retry the lazy setup, so a bad config should not block startup
+        logger.error("Error setting up Reddit API: %s", e)
+    clustering_pool.start()
+    job_manager.start()
+    warmup_task = asyncio.create_task(warm_up()) if WARMUP_ON_STARTUP else None
+    try:
+        yield
+    finally:
+        if warmup_task is not None:
+            warmup_task.cancel()
+        await job_manager.stop()
+        clustering_pool.shutdown()
+        await close_reddit()
 
 app = FastAPI(
     title="Reddit Pain Points Analyzer",
-    description="API for analyzing pain points from Reddit posts"
+    description="API for analyzing pain points from Reddit posts",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """
+    Record request latency and, if enabled, report stage durations in a Server-Timing header
+    
+    Streaming responses send their headers before the pipeline runs, so only
+    stages finished by then are included.
+    """
+    start = time.perf_counter()
+    with track_request() as timings:
+        response = await call_next(request)
+    route = request.scope.get("route")
+    request_seconds.observe(
+        time.perf_counter() - start,
+        path=getattr(route, "path", "unmatched"),
+        method=request.method,
+        status=str(response.status_code),
+    )
+    if SERVER_TIMING_HEADER and timings:
+        response.headers["Server-Timing"] = server_timing(timings)
+    return response
 
 # Pydantic models for request/response
 class RedditAnalysisRequest(BaseModel):
     subreddits: List[str]
     search_limit: Optional[int] = 30
+    bypass_cache: bool = False
+    # True adds the full body and link to every post, next to its snippet
+    include_content: bool = False
+    # "fast" names and summarizes categories from their keywords and sentences instead of the LLM
+    mode: Literal["llm", "fast"] = "llm"
 
 class RedditPost(BaseModel):
+    id: str
     subreddit: str
-    subreddit_icon: Optional[str] = None
     title: str
-    content: str
-    url: str
+    permalink: str
+    snippet: str
     score: int
     num_comments: int
+    pain_score: Optional[float] = None
+    content: Optional[str] = None
+    url: Optional[str] = None
 
 class Category(BaseModel):
     category: str
@@ -29,8 +129,10 @@ class Category(BaseModel):
     posts: List[RedditPost]
 
 class RedditAnalysisResponse(BaseModel):
-    categories: dict
+    categories: Dict[int, Category]
     total_posts: int
+    failed_subreddits: Dict[str, str] = {}
+    filtered: Dict[str, int] = {}
 
 
 # Add new Pydantic models for the subreddit search endpoint
@@ -50,6 +152,12 @@ class SubredditSearchResponse(BaseModel):
     subreddits: List[SubredditInfo]
     count: int
 
+class JobResponse(BaseModel):
+    job_id: str
+    status: str
+    result: Optional[RedditAnalysisResponse] = None
+    error: Optional[str] = None
+
 @app.post("/search-subreddits", response_model=SubredditSearchResponse)
 async def search_subreddits(request: SubredditSearchRequest):
     """
@@ -66,38 +174,214 @@ async def search_subreddits(request: SubredditSearchRequest):
             subreddits=subreddits,
             count=len(subreddits)
         )
+    except RedditRateLimited as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 
+async def analysis_events(request: RedditAnalysisRequest) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run the analysis pipeline, yielding progress events and each category as it is ready
+    
+    Events:
+        posts_fetched: total_posts and failed_subreddits
+        posts_filtered: posts removed before clustering, by reason
+        clusters_found: number of clusters, outlier posts and posts not classified as pain points
+        category: cluster_id and the summarized category, from the LLM or,
+            in fast mode, from its keywords and most representative sentences
+    """
+    # Get posts, embedding them in micro-batches while later pages are still arriving
+    embedder = MicroBatchEmbedder(embed_texts_async) if PIPELINE_EMBEDDING else None
+    results = []
+    failed_subreddits = {}
+    embedded_keys = set()
+    try:
+        with timed("fetch"):
+            async for post in stream_posts_from_subreddits(
+                request.subreddits,
+                failed_subreddits,
+                search_limit=request.search_limit,
+                use_cache=not request.bypass_cache
+            ):
+                results.append(post)
+                # Posts filter_posts drops without comparing them to others are not worth embedding;
+                # near-duplicates are only known once every post has arrived
+                if embedder is not None and drop_reason(post) is None:
+                    key = duplicate_key(post)
+                    if key not in embedded_keys:
+                        embedded_keys.add(key)
+                        embedder.add(post_text(post))
+        if embedder is not None:
+            # Clustering then starts from stored embeddings
+            with timed("embed_wait"):
+                await embedder.close()
+    finally:
+        if embedder is not None:
+            embedder.cancel()
+    results = order_by_subreddit(results, request.subreddits)
+    yield {"event": "posts_fetched", "total_posts": len(results), "failed_subreddits": failed_subreddits}
+    
+    # Drop duplicates and junk before clustering
+    with timed("filter"):
+        posts, filtered = await asyncio.to_thread(filter_posts, results)
+    yield {"event": "posts_filtered", "kept": len(posts), "filtered": filtered}
+    
+    # Categorize and summarize
+    # Includes waiting for a worker; the embed, classify and cluster stages are reported by the worker
+    with timed("categorize"):
+        categorized_posts = await categorize_posts_async(posts)
+    yield {
+        "event": "clusters_found",
+        "clusters": len([cluster for cluster in categorized_posts if cluster != -1]),
+        "outliers": len(categorized_posts.get(-1, [])),
+        "not_pain_points": len(posts) - sum(len(cluster_posts) for cluster_posts in categorized_posts.values()),
+    }
+    
+    if request.mode == "fast":
+        with timed("label"):
+            categories = await asyncio.to_thread(label_clusters, categorized_posts)
+        for cluster, category in categories.items():
+            yield {"event": "category", "cluster_id": int(cluster), "category": category_response(category, request.include_content)}
+        return
+
+    with timed("summarize"):
+        async for cluster, category in iter_pain_point_summaries(categorized_posts, use_cache=not request.bypass_cache):
+            yield {"event": "category", "cluster_id": int(cluster), "category": category_response(category, request.include_content)}
+
+def category_response(category: Dict[str, Any], include_content: bool) -> Dict[str, Any]:
+    """
+    Convert a summarized category into its response form
+    """
+    return {
+        'category': category['category'],
+        'pain_points': category['pain_points'],
+        'posts': [post.to_response(include_content) for post in category['posts']],
+    }
+
+async def run_analysis(request: RedditAnalysisRequest) -> Dict[str, Any]:
+    """
+    Run the analysis pipeline to completion and build the response body
+    
+    The body is built from plain dicts and serialized with orjson; it follows
+    RedditAnalysisResponse without being validated against it.
+    """
+    categories = {}
+    total_posts = 0
+    failed_subreddits = {}
+    filtered = {}
+    async for event in analysis_events(request):
+        if event["event"] == "posts_fetched":
+            total_posts = event["total_posts"]
+            failed_subreddits = event["failed_subreddits"]
+        elif event["event"] == "posts_filtered":
+            filtered = event["filtered"]
+        elif event["event"] == "clusters_found":
+            filtered["not_pain_points"] = event["not_pain_points"]
+        elif event["event"] == "category":
+            categories[event["cluster_id"]] = event["category"]
+    
+    return {
+        'categories': dict(sorted(categories.items())),
+        'total_posts': total_posts,
+        'failed_subreddits': failed_subreddits,
+        'filtered': filtered,
+    }
+
+def analysis_key(request: RedditAnalysisRequest) -> str:
+    """
+    Return a key that is equal for requests asking for the same analysis
+    """
+    params = request.model_dump()
+    params["subreddits"] = sorted({name.strip().lower() for name in request.subreddits})
+    return json.dumps(params, sort_keys=True)
+
 @app.post("/analyze", response_model=RedditAnalysisResponse)
 async def analyze_subreddits(request: RedditAnalysisRequest):
     """
     Analyze pain points from specified subreddits
     """
     try:
-        # Get posts
-        results = await get_posts_from_subreddits(
-            subreddits=request.subreddits,
-            search_limit=request.search_limit
-        )
-        
-        # Categorize and summarize
-        categorized_posts = categorize_posts(results)
-        categories = summarize_pain_points(categorized_posts)
-        
-        return RedditAnalysisResponse(
-            categories=categories,
-            total_posts=len(results)
-        )
+        return ORJSONResponse(await run_analysis(request))
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    except RedditRateLimited as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/analyze/stream")
+async def analyze_subreddits_stream(request: RedditAnalysisRequest):
+    """
+    Analyze pain points from specified subreddits, streaming NDJSON events
+    
+    Each line is one JSON event: posts_fetched, clusters_found, then one
+    category event per summarized category as soon as it is ready, and
+    finally done (or error, with a status code, if the pipeline fails).
+    """
+    async def stream():
+        categories = 0
+        try:
+            async for event in analysis_events(request):
+                if event["event"] == "category":
+                    categories += 1
+                yield orjson.dumps(event) + b"\n"
+            yield orjson.dumps({"event": "done", "categories": categories}) + b"\n"
+        except PoolSaturatedError as e:
+            yield orjson.dumps({"event": "error", "status_code": 429, "detail": str(e)}) + b"\n"
+        except RedditRateLimited as e:
+            yield orjson.dumps({
+                "event": "error", "status_code": 429, "detail": str(e), "retry_after": math.ceil(e.retry_after)
+            }) + b"\n"
+        except Exception as e:
+            yield orjson.dumps({"event": "error", "status_code": 500, "detail": str(e)}) + b"\n"
+
+    # Not gzipped: compression would hold back events until enough bytes are buffered
+    return StreamingResponse(stream(), media_type="application/x-ndjson", headers={"Content-Encoding": "identity"})
+
+@app.post("/jobs/analyze", response_model=JobResponse, status_code=202)
+async def submit_analysis_job(request: RedditAnalysisRequest):
+    """
+    Queue an analysis and return its job id
+    
+    Identical requests submitted while a job for them is queued or running
+    share that job instead of running the pipeline again.
+    """
+    try:
+        job = job_manager.submit(analysis_key(request), lambda: run_analysis(request))
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    return JobResponse(job_id=job.id, status=job.status)
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_analysis_job(job_id: str):
+    """
+    Get the status of an analysis job, and its result once it has finished
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return ORJSONResponse({'job_id': job.id, 'status': job.status, 'result': job.result, 'error': job.error})
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Metrics in the Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness check endpoint, healthy only once warm-up has finished"""
+    if warmup_state["ready"]:
+        return {"status": "ready"}
+    if warmup_state["error"]:
+        return JSONResponse(status_code=503, content={"status": "error", "detail": warmup_state["error"]})
+    return JSONResponse(status_code=503, content={"status": "warming_up"})
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,297 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Add a Server-Timing header with per-stage durations to /analyze responses
+SERVER_TIMING_HEADER = os.getenv("SERVER_TIMING_HEADER", "true").lower() in ("1", "true", "yes")
+
+# Latency buckets in seconds, from a cache hit to a slow topic model fit
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def configure_logging(level: str = LOG_LEVEL) -> None:
+    """
+    Send log records of every module to stderr; also called in worker processes
+    """
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s [%(processName)s] %(name)s: %(message)s")
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally split by labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        if amount <= 0:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        _record("inc", self.name, labels, amount)
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down; read from function at scrape time if one is given
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation)
+        self._function = function
+        self._value = 0.0
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def _samples(self) -> List[str]:
+        value = self._function() if self._function is not None else self._value
+        return [f"{self.name} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets, optionally split by labels"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+        _record("observe", self.name, labels, value)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = sorted((key, list(counts), self._sums[key]) for key, counts in self._counts.items())
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                bucket_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, bucket_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """
+        Return every metric in the Prometheus text exposition format
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Updates made while collect() is active, so worker processes can send them back with their result
+_recording: ContextVar[Optional[List[Tuple[str, str, Dict[str, str], float]]]] = ContextVar("metrics_recording", default=None)
+# Stage durations of the current request, reported in its Server-Timing header
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def _record(kind: str, name: str, labels: Dict[str, str], value: float) -> None:
+    updates = _recording.get()
+    if updates is not None:
+        updates.append((kind, name, labels, value))
+
+
+@contextmanager
+def collect() -> Iterator[List[Tuple[str, str, Dict[str, str], float]]]:
+    """
+    Record the metric updates made inside the block, e.g. in a worker process
+
+    The yielded list can be pickled and applied in the parent process with apply().
+    """
+    updates: List[Tuple[str, str, Dict[str, str], float]] = []
+    token = _recording.set(updates)
+    try:
+        yield updates
+    finally:
+        _recording.reset(token)
+
+
+def apply(updates: List[Tuple[str, str, Dict[str, str], float]]) -> None:
+    """
+    Apply metric updates recorded by collect(), including stage timings of the current request
+    """
+    for kind, name, labels, value in updates:
+        metric = registry.get(name)
+        if kind == "inc" and isinstance(metric, Counter):
+            metric.inc(value, **labels)
+        elif kind == "observe" and isinstance(metric, Histogram):
+            metric.observe(value, **labels)
+            if metric is stage_seconds:
+                _add_request_timing(labels["stage"], value)
+
+
+def _add_request_timing(stage: str, seconds: float) -> None:
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def track_request() -> Iterator[Dict[str, float]]:
+    """
+    Collect the stage durations of the request handled inside the block
+    """
+    timings: Dict[str, float] = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """
+    Format stage durations as a Server-Timing header value (durations in milliseconds)
+    """
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+stage_seconds = Histogram(
+    "superred_stage_seconds", "Duration of pipeline stages in seconds", ["stage"]
+)
+upstream_seconds = Histogram(
+    "superred_upstream_seconds", "Duration of single calls to external services in seconds", ["service"]
+)
+request_seconds = Histogram(
+    "superred_http_request_seconds", "Duration of HTTP requests in seconds", ["path", "method", "status"]
+)
+posts_total = Counter(
+    "superred_posts_total",
+    "Posts by pipeline outcome (fetched, filtered, clustered, outlier, not_pain_point)",
+    ["outcome"],
+)
+posts_filtered_total = Counter(
+    "superred_posts_filtered_total", "Posts removed before clustering by reason", ["reason"]
+)
+subreddit_failures_total = Counter(
+    "superred_subreddit_failures_total", "Subreddits that could not be fetched"
+)
+llm_requests_total = Counter(
+    "superred_llm_requests_total", "LLM calls by outcome (success, retry, error)", ["outcome"]
+)
+llm_tokens_total = Counter(
+    "superred_llm_tokens_total", "LLM tokens used by type (prompt, completion)", ["type"]
+)
+reddit_queue_seconds = Histogram(
+    "superred_reddit_queue_seconds", "Time Reddit calls waited for the rate-limit scheduler by priority", ["priority"]
+)
+reddit_rejected_total = Counter(
+    "superred_reddit_rejected_total", "Reddit calls failed fast because the scheduler queue was too long", ["priority"]
+)
+llm_batch_fallbacks_total = Counter(
+    "superred_llm_batch_fallbacks_total",
+    "Clusters summarized on their own because a batched summary response missed or invalidated them",
+)
+cache_requests_total = Counter(
+    "superred_cache_requests_total", "Cache lookups by cache and result (hit, near_hit, miss)", ["cache", "result"]
+)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """
+    Time the block as a pipeline stage, for the stage histogram and the request's Server-Timing
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        stage_seconds.observe(seconds, stage=stage)
+        _add_request_timing(stage, seconds)
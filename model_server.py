@@ -0,0 +1,227 @@
+"""
+Shared model server for multi-worker deployments
+
+Runs the clustering pool, and with it the only copy of the embedding model,
+in one process and serves embedding and clustering jobs to every API worker
+over a Unix socket. Embedding requests that arrive from different workers
+within MODEL_SERVER_BATCH_WINDOW seconds are encoded as one batch.
+
+Usage:
+    python model_server.py --socket /tmp/superred-model.sock
+    MODEL_SERVER_SOCKET=/tmp/superred-model.sock uvicorn main:app --workers 4
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+import metrics
+from clustering_pool import JOBS, ClusteringPool, PoolSaturatedError, _embed_job, read_frame, write_frame
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = "/tmp/superred-model.sock"
+# Embedding requests from all API workers collected into one batch
+MODEL_SERVER_BATCH_WINDOW = float(os.getenv("MODEL_SERVER_BATCH_WINDOW", "0.02"))
+MODEL_SERVER_BATCH_SIZE = int(os.getenv("MODEL_SERVER_BATCH_SIZE", "256"))
+
+
+class EmbedCoalescer:
+    """
+    Merge concurrent embedding requests into batches for the pool
+
+    A batch is sent once it holds batch_size texts or window seconds after its
+    first request arrived. Every request of a batch is answered when the batch
+    is done; its metric updates go to the first request only, so they are
+    counted once.
+
+    Args:
+        pool: Clustering pool that embeds the batches
+        window: Seconds to wait for more requests before sending a batch
+        batch_size: Number of texts that sends a batch right away
+    """
+
+    def __init__(self, pool: ClusteringPool, window: float = MODEL_SERVER_BATCH_WINDOW,
+                 batch_size: int = MODEL_SERVER_BATCH_SIZE):
+        self.pool = pool
+        self.window = window
+        self.batch_size = max(1, batch_size)
+        self.batches = 0
+        self.requests = 0
+        self._texts: List[str] = []
+        self._waiting: List[asyncio.Future] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def embed(self, texts: List[str]) -> List:
+        """
+        Embed texts together with other waiting requests and return the metric updates
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._texts.extend(texts)
+        self._waiting.append(future)
+        self.requests += 1
+        if len(self._texts) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._waiting:
+            return
+        texts, self._texts = list(dict.fromkeys(self._texts)), []
+        waiting, self._waiting = self._waiting, []
+        self.batches += 1
+        asyncio.create_task(self._run(texts, waiting))
+
+    async def _run(self, texts: List[str], waiting: List[asyncio.Future]) -> None:
+        try:
+            updates = await self.pool.run(_embed_job, texts, background=True)
+        except Exception as e:
+            for future in waiting:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for i, future in enumerate(waiting):
+            if not future.done():
+                future.set_result(updates if i == 0 else [])
+
+
+class ModelServer:
+    """
+    Serve clustering pool jobs to API workers over a Unix socket
+
+    Args:
+        path: Unix socket to listen on
+        pool: Clustering pool running the jobs
+    """
+
+    def __init__(self, path: str, pool: Optional[ClusteringPool] = None):
+        self.path = path
+        self.pool = pool or ClusteringPool()
+        self.coalescer = EmbedCoalescer(self.pool)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.StreamWriter] = set()
+        self._warmup: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """
+        Start the pool, begin warming it up and listen for API workers
+        """
+        self.pool.start()
+        self._warmup = asyncio.create_task(self.pool.warm_up())
+        if os.path.exists(self.path):
+            # Left behind by a server that did not shut down cleanly
+            os.unlink(self.path)
+        # Jobs are pickled, so only the user running the API may connect. The socket is
+        # bound under a restrictive umask so it never exists with wider permissions
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            sock.bind(self.path)
+        except OSError:
+            sock.close()
+            raise
+        finally:
+            os.umask(umask)
+        self._server = await asyncio.start_unix_server(self._handle, sock=sock)
+        logger.info("Model server listening on %s with %d workers", self.path, self.pool.workers)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # API workers see the connection close and reconnect to the next server
+            for writer in list(self._connections):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._warmup is not None:
+            self._warmup.cancel()
+        self.pool.shutdown()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        write_lock = asyncio.Lock()
+        tasks = set()
+        self._connections.add(writer)
+        try:
+            while True:
+                request = await read_frame(reader)
+                task = asyncio.create_task(self._answer(request, writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # The API worker closed its connection
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _run_job(self, job: str, args: Tuple) -> Any:
+        if job == "warmup":
+            # Answered once the shared pool has warmed up, which happens once for all workers
+            await asyncio.shield(self._warmup)
+            return None
+        if job == "embed":
+            return await self.coalescer.embed(*args)
+        return await self.pool.run(JOBS[job], *args)
+
+    async def _answer(self, request: Dict, writer: asyncio.StreamWriter, write_lock: asyncio.Lock) -> None:
+        response: Dict[str, Any] = {"id": request["id"]}
+        try:
+            response["result"] = await self._run_job(request["job"], request["args"])
+        except PoolSaturatedError as e:
+            response.update(error=str(e), saturated=True)
+        except Exception as e:
+            logger.error("Error running %s job: %s", request.get("job"), e)
+            response["error"] = str(e) or type(e).__name__
+        try:
+            async with write_lock:
+                await write_frame(writer, response)
+        except ConnectionError:
+            pass
+
+
+async def serve(path: str) -> None:
+    server = ModelServer(path)
+    await server.start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        logger.info(
+            "Embedded %d requests in %d batches", server.coalescer.requests, server.coalescer.batches
+        )
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--socket", default=os.getenv("MODEL_SERVER_SOCKET") or DEFAULT_SOCKET,
+        help="Unix socket to listen on (default: MODEL_SERVER_SOCKET or %(default)s)",
+    )
+    args = parser.parse_args()
+    metrics.configure_logging()
+    asyncio.run(serve(args.socket))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Pain-point classifier run on post embeddings before clustering
+
+Train a logistic-regression head for PAIN_CLASSIFIER_HEAD from labeled posts,
+one JSON object per line with "text" and "label" (1 for a pain point, 0 otherwise):
+
+    python pain_classifier.py labeled_posts.jsonl --output pain_head.npz
+
+The head is fitted on embeddings of the configured EMBEDDING_MODEL and
+EMBEDDING_BACKEND; train a new head when either changes.
+"""
+import argparse
+import json
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Posts scoring below this are dropped before clustering (0 keeps every post)
+PAIN_SCORE_THRESHOLD = float(os.getenv("PAIN_SCORE_THRESHOLD", "0.3"))
+# Optional .npz file with a logistic-regression head ("weights", "bias") trained on post embeddings
+PAIN_CLASSIFIER_HEAD = os.getenv("PAIN_CLASSIFIER_HEAD", "")
+# Similarity margin (pain minus other prototypes) that moves the zero-shot score from 0.5 to about 0.73
+PAIN_SCORE_TEMPERATURE = float(os.getenv("PAIN_SCORE_TEMPERATURE", "0.05"))
+
+# Zero-shot prototypes, embedded with the same model as the posts
+PAIN_PROTOTYPES = [
+    "This keeps breaking and I am so frustrated with it.",
+    "I have a problem that nobody can help me fix.",
+    "Why is this so slow, buggy and unreliable?",
+    "I am annoyed that this feature was removed or never worked.",
+    "Customer support ignored me and I was charged twice.",
+    "I hate how hard and confusing this is to use.",
+    "It crashed again and I lost all my work.",
+    "I am struggling with this issue and cannot find a solution.",
+]
+OTHER_PROTOTYPES = [
+    "I just finished my project, here is what I built.",
+    "Check out this interesting article I found.",
+    "What is your favorite tool for this and why?",
+    "Thank you all, this community is awesome.",
+    "Announcing the new release with these features.",
+    "Here is a tutorial on how to get started.",
+    "Weekly discussion thread, share anything you like.",
+    "I love how well this works, highly recommend it.",
+]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(x, -30, 30)))
+
+
+class PainPointClassifier:
+    """
+    Score how likely posts are to describe a pain point from their embeddings
+
+    Uses the logistic-regression head if one is given, otherwise zero-shot
+    similarity to the pain-point and other prototypes.
+
+    Args:
+        pain_prototypes: Embeddings of PAIN_PROTOTYPES
+        other_prototypes: Embeddings of OTHER_PROTOTYPES
+        head: Optional (weights, bias) of a logistic-regression head
+        temperature: Similarity margin scale of the zero-shot score
+    """
+
+    def __init__(
+        self,
+        pain_prototypes: np.ndarray,
+        other_prototypes: np.ndarray,
+        head: Optional[Tuple[np.ndarray, float]] = None,
+        temperature: float = PAIN_SCORE_TEMPERATURE,
+    ):
+        self.pain_prototypes = _normalize(pain_prototypes)
+        self.other_prototypes = _normalize(other_prototypes)
+        self.head = head
+        self.temperature = temperature
+
+    def score(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Return a pain-point probability between 0 and 1 for each embedding
+        """
+        vectors = _normalize(embeddings)
+        if self.head is not None:
+            weights, bias = self.head
+            return _sigmoid(vectors @ weights + bias)
+        margin = (vectors @ self.pain_prototypes.T).max(axis=1) - (vectors @ self.other_prototypes.T).max(axis=1)
+        return _sigmoid(margin / self.temperature)
+
+
+def fit_head(
+    embeddings: np.ndarray,
+    labels: np.ndarray,
+    l2: float = 1e-3,
+    learning_rate: float = 1.0,
+    epochs: int = 500,
+) -> Tuple[np.ndarray, float]:
+    """
+    Fit a logistic-regression head on labeled post embeddings with gradient descent
+
+    Args:
+        embeddings: Post embeddings, one row per post
+        labels: 1 for pain points, 0 otherwise
+        l2: L2 regularization strength
+        learning_rate: Gradient descent step size
+        epochs: Number of full-batch gradient steps
+
+    Returns:
+        Tuple of (weights, bias)
+    """
+    x = _normalize(embeddings)
+    y = np.asarray(labels, dtype=np.float32)
+    weights = np.zeros(x.shape[1], dtype=np.float32)
+    bias = 0.0
+    for _ in range(epochs):
+        error = _sigmoid(x @ weights + bias) - y
+        weights -= learning_rate * (x.T @ error / len(y) + l2 * weights)
+        bias -= learning_rate * float(error.mean())
+    return weights, bias
+
+
+def save_head(path: str, weights: np.ndarray, bias: float) -> None:
+    np.savez(path, weights=weights, bias=np.float32(bias))
+
+
+def load_head(path: str) -> Optional[Tuple[np.ndarray, float]]:
+    """
+    Load a head saved by save_head, or None if path is empty or missing
+    """
+    if not path or not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return data["weights"].astype(np.float32), float(data["bias"])
+
+
+def load_labeled_posts(path: str) -> Tuple[List[str], np.ndarray]:
+    """
+    Read texts and 0/1 labels from a JSON-lines file
+    """
+    texts, labels = [], []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            texts.append(record["text"])
+            labels.append(int(record["label"]))
+    return texts, np.asarray(labels, dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("data", help="JSON-lines file of labeled posts")
+    parser.add_argument("--output", default="pain_head.npz", help="Where to save the head (default: %(default)s)")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Share of posts kept out of training to report accuracy")
+    parser.add_argument("--l2", type=float, default=1e-3, help="L2 regularization strength")
+    parser.add_argument("--epochs", type=int, default=500, help="Gradient descent steps")
+    args = parser.parse_args()
+
+    # Deferred: utils imports this module
+    from utils import embed_texts
+
+    texts, labels = load_labeled_posts(args.data)
+    if len(set(labels.tolist())) < 2:
+        parser.error("Training needs both pain-point (1) and other (0) posts")
+    embeddings = embed_texts(texts)
+
+    order = np.random.default_rng(0).permutation(len(texts))
+    holdout = order[:int(len(texts) * args.holdout)]
+    train = order[len(holdout):]
+    weights, bias = fit_head(embeddings[train], labels[train], l2=args.l2, epochs=args.epochs)
+    save_head(args.output, weights, bias)
+
+    for name, rows in (("train", train), ("holdout", holdout)):
+        if len(rows):
+            predicted = _sigmoid(_normalize(embeddings[rows]) @ weights + bias) >= 0.5
+            print(f"{name} accuracy: {(predicted == (labels[rows] == 1)).mean():.3f} on {len(rows)} posts")
+    print(f"Saved head to {args.output}; set PAIN_CLASSIFIER_HEAD to use it")
+
+
+if __name__ == "__main__":
+    main()
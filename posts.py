@@ -0,0 +1,70 @@
+import os
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Characters of the post body returned as snippet
+RESPONSE_SNIPPET_CHARS = int(os.getenv("RESPONSE_SNIPPET_CHARS", "280"))
+
+REDDIT_URL = "https://www.reddit.com"
+
+
+@dataclass(slots=True)
+class Post:
+    """
+    A Reddit post as it flows through the pipeline
+    """
+
+    subreddit: str
+    title: str
+    content: str
+    url: str = ""
+    score: int = 0
+    num_comments: int = 0
+    id: str = ""
+    permalink: str = ""
+    is_crosspost: bool = False
+    pain_score: Optional[float] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Post":
+        """
+        Build a post from a dictionary, e.g. a cached one, ignoring unknown keys
+        """
+        return cls(**{field.name: data[field.name] for field in fields(cls) if field.name in data})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def snippet(self, limit: int = RESPONSE_SNIPPET_CHARS) -> str:
+        """
+        Return the start of the body, cut at a word boundary
+        """
+        text = " ".join(self.content.split())
+        if len(text) <= limit:
+            return text
+        cut = text[:limit].rsplit(" ", 1)[0]
+        return cut + "…"
+
+    def to_response(self, include_content: bool = False) -> Dict[str, Any]:
+        """
+        Return the post as served by the API; the body and link are left out unless include_content
+        """
+        response = {
+            'id': self.id,
+            'subreddit': self.subreddit,
+            'title': self.title,
+            'permalink': REDDIT_URL + self.permalink if self.permalink.startswith("/") else self.permalink,
+            'snippet': self.snippet(),
+            'score': self.score,
+            'num_comments': self.num_comments,
+            'pain_score': self.pain_score,
+        }
+        if include_content:
+            response['content'] = self.content
+            response['url'] = self.url
+        return response
@@ -0,0 +1,227 @@
+import logging
+import math
+import os
+from typing import Any, List, Tuple
+
+from dotenv import load_dotenv
+
+from filtering import has_body
+from posts import Post
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the summarization prompt changes so cached summaries are not reused
+PROMPT_VERSION = "3"
+# The same for BATCH_SUMMARY_PROMPT, which summaries of batched clusters are cached under
+BATCH_PROMPT_VERSION = "2"
+
+# Token budget for the posts in one summarization prompt, and the share one post may use
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+PROMPT_POST_TOKEN_LIMIT = int(os.getenv("PROMPT_POST_TOKEN_LIMIT", "250"))
+# Token budget for the posts of all clusters summarized together in one prompt
+PROMPT_BATCH_TOKEN_BUDGET = int(os.getenv("PROMPT_BATCH_TOKEN_BUDGET", "6000"))
+
+# Rough characters per token for English text; avoids a tokenizer round-trip
+CHARS_PER_TOKEN = 4
+
+SUMMARY_PROMPT = """
+Based on these related posts, identify the common pain point or problem these users are experiencing.
+
+Posts:
+{posts}
+
+You must respond in valid JSON format with exactly these fields:
+
+category: A category name that best describes these related issues
+pain_points: 2-4 sentences summarizing the shared problems
+
+Do not include any other text, explanations, or formatting in your response.
+There should be only one category and one pain point.
+
+Make it short and concise.
+"""
+
+BATCH_SUMMARY_PROMPT = """
+Below are several clusters of related posts, each introduced by its cluster ID.
+For every cluster, identify the common pain point or problem its users are experiencing.
+
+{clusters}
+
+You must respond in valid JSON format with a "categories" list holding one entry per cluster, each with exactly these fields:
+
+cluster_id: The cluster ID given above
+category: A category name that best describes the cluster's related issues
+pain_points: 2-4 sentences summarizing the cluster's shared problems
+
+Summarize every cluster from its own posts only, and do not merge or skip clusters.
+Do not include any other text, explanations, or formatting in your response.
+
+Make it short and concise.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of LLM tokens in text
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut text to about max_tokens tokens, on a word boundary where possible
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    if " " in cut[max_chars // 2:]:
+        cut = cut[:cut.rindex(" ")]
+    return cut.rstrip() + "..."
+
+
+def format_post(post: Post, max_tokens: int = PROMPT_POST_TOKEN_LIMIT) -> str:
+    """
+    Format one post for a prompt: its title and a truncated body
+
+    Bodies Reddit left behind for removed or deleted posts are left out, so
+    moderation notices neither use tokens nor shape the category.
+    """
+    title = " ".join(post.title.split())
+    body = " ".join(post.content.split())
+    if not has_body(post):
+        return f"- {title}"
+    return f"- {title}\n  {truncate_to_tokens(body, max_tokens)}"
+
+
+def select_posts(
+    posts: List[Post],
+    token_budget: int = PROMPT_TOKEN_BUDGET,
+    post_token_limit: int = PROMPT_POST_TOKEN_LIMIT,
+) -> Tuple[List[str], int]:
+    """
+    Format posts in order until the token budget is spent
+
+    Posts are expected to be ordered from most to least representative of the
+    cluster (categorize_posts orders them by similarity to the cluster centroid),
+    so large clusters keep their most typical posts.
+
+    Args:
+        posts: Posts in the cluster, most representative first
+        token_budget: Maximum number of tokens used by all posts together
+        post_token_limit: Maximum number of tokens of each post body
+
+    Returns:
+        Tuple of (formatted posts, estimated number of tokens used)
+    """
+    selected = []
+    used = 0
+    for post in posts:
+        formatted = format_post(post, post_token_limit)
+        tokens = estimate_tokens(formatted) + 1
+        if selected and used + tokens > token_budget:
+            break
+        selected.append(formatted)
+        used += tokens
+    return selected, used
+
+
+def build_summary_prompt(
+    posts: List[Post],
+    token_budget: int = PROMPT_TOKEN_BUDGET,
+    post_token_limit: int = PROMPT_POST_TOKEN_LIMIT,
+) -> str:
+    """
+    Build the prompt that asks the LLM to summarize one cluster of posts
+
+    Args:
+        posts: Posts in the cluster, most representative first
+        token_budget: Maximum number of tokens used by the posts
+        post_token_limit: Maximum number of tokens of each post body
+
+    Returns:
+        Prompt text
+    """
+    selected, used = select_posts(posts, token_budget, post_token_limit)
+    logger.debug("Prompt uses %d of %d posts (~%d tokens)", len(selected), len(posts), used)
+    return SUMMARY_PROMPT.format(posts="\n".join(selected))
+
+
+def format_cluster(
+    cluster_id: Any,
+    posts: List[Post],
+    token_budget: int = PROMPT_TOKEN_BUDGET,
+    post_token_limit: int = PROMPT_POST_TOKEN_LIMIT,
+) -> Tuple[str, int]:
+    """
+    Format one cluster for a batch prompt: its ID followed by its posts
+
+    Returns:
+        Tuple of (formatted cluster, estimated number of tokens used)
+    """
+    selected, used = select_posts(posts, token_budget, post_token_limit)
+    header = f"Cluster {cluster_id}:"
+    return "\n".join([header] + selected), used + estimate_tokens(header) + 1
+
+
+def pack_clusters(
+    clusters: List[Tuple[Any, List[Post]]],
+    max_clusters: int,
+    token_budget: int = PROMPT_BATCH_TOKEN_BUDGET,
+    post_token_limit: int = PROMPT_POST_TOKEN_LIMIT,
+) -> List[List[Tuple[Any, List[Post]]]]:
+    """
+    Group clusters into batches that fit one prompt each, keeping their order
+
+    A batch is closed once it holds max_clusters clusters or the next cluster
+    would take its posts over token_budget; a cluster larger than the budget
+    gets a batch of its own.
+
+    Args:
+        clusters: (cluster ID, posts) pairs
+        max_clusters: Maximum number of clusters per batch
+        token_budget: Maximum number of tokens used by the posts of a batch
+        post_token_limit: Maximum number of tokens of each post body
+
+    Returns:
+        List of batches of (cluster ID, posts) pairs
+    """
+    batches: List[List[Tuple[Any, List[Post]]]] = []
+    batch: List[Tuple[Any, List[Post]]] = []
+    used = 0
+    for cluster_id, posts in clusters:
+        _, tokens = format_cluster(cluster_id, posts, token_budget, post_token_limit)
+        if batch and (len(batch) >= max_clusters or used + tokens > token_budget):
+            batches.append(batch)
+            batch, used = [], 0
+        batch.append((cluster_id, posts))
+        used += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def build_batch_summary_prompt(
+    clusters: List[Tuple[Any, List[Post]]],
+    token_budget: int = PROMPT_BATCH_TOKEN_BUDGET,
+    post_token_limit: int = PROMPT_POST_TOKEN_LIMIT,
+) -> str:
+    """
+    Build the prompt that asks the LLM to summarize several clusters at once
+
+    Args:
+        clusters: (cluster ID, posts) pairs, e.g. one batch of pack_clusters
+        token_budget: Maximum number of tokens used by the posts of all clusters
+        post_token_limit: Maximum number of tokens of each post body
+
+    Returns:
+        Prompt text
+    """
+    formatted = [format_cluster(cluster_id, posts, token_budget, post_token_limit) for cluster_id, posts in clusters]
+    logger.debug(
+        "Batch prompt summarizes %d clusters (~%d tokens)", len(clusters), sum(tokens for _, tokens in formatted)
+    )
+    return BATCH_SUMMARY_PROMPT.format(clusters="\n\n".join(text for text, _ in formatted))
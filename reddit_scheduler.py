@@ -0,0 +1,363 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, Mapping, Optional
+
+from asyncprawcore import Requestor
+from asyncprawcore.rate_limit import RateLimiter
+from dotenv import load_dotenv
+
+import metrics
+from metrics import reddit_queue_seconds, reddit_rejected_total
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Send every Reddit call through the scheduler below
+REDDIT_SCHEDULER = os.getenv("REDDIT_SCHEDULER", "true").lower() in ("1", "true", "yes")
+# Quota assumed until Reddit's X-Ratelimit headers report the real one: requests per window
+REDDIT_RATE_LIMIT = int(os.getenv("REDDIT_RATE_LIMIT", "600"))
+REDDIT_RATE_WINDOW = float(os.getenv("REDDIT_RATE_WINDOW", "600"))
+# Requests that may be sent back to back after an idle period
+REDDIT_BURST = int(os.getenv("REDDIT_BURST", "60"))
+# Tokens bulk calls leave in the bucket so interactive calls rarely wait
+REDDIT_INTERACTIVE_RESERVE = int(os.getenv("REDDIT_INTERACTIVE_RESERVE", "2"))
+# Calls fail fast when they would wait longer than this for their turn
+REDDIT_MAX_QUEUE_WAIT = float(os.getenv("REDDIT_MAX_QUEUE_WAIT", "10"))
+# Reddit endpoints, e.g. a local fake Reddit in tests and benchmarks
+REDDIT_OAUTH_URL = os.getenv("REDDIT_OAUTH_URL", "https://oauth.reddit.com")
+REDDIT_AUTH_URL = os.getenv("REDDIT_AUTH_URL", "https://www.reddit.com")
+
+# Priorities, served lowest value first
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+
+class RedditRateLimited(Exception):
+    """
+    Raised when a Reddit call would wait longer than allowed for the rate limit
+
+    Args:
+        retry_after: Seconds after which the call would likely get its turn
+    """
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"Reddit rate limit reached, retry in {retry_after:.0f} seconds")
+
+
+# Priority, flow and deadline (monotonic time) of the Reddit calls made in the current context
+_priority: ContextVar[int] = ContextVar("reddit_priority", default=BULK)
+_flow: ContextVar[Optional[int]] = ContextVar("reddit_flow", default=None)
+_deadline: ContextVar[Optional[float]] = ContextVar("reddit_deadline", default=None)
+_flow_ids = itertools.count(1)
+
+
+@contextmanager
+def reddit_flow(priority: int = BULK) -> Iterator[None]:
+    """
+    Schedule the Reddit calls made inside the block, including tasks it starts, as one flow
+
+    Flows of the same priority take turns, so one large analysis cannot hold
+    back the calls of every other request.
+    """
+    priority_token = _priority.set(priority)
+    flow_token = _flow.set(next(_flow_ids))
+    try:
+        yield
+    finally:
+        _flow.reset(flow_token)
+        _priority.reset(priority_token)
+
+
+@contextmanager
+def reddit_deadline(seconds: float) -> Iterator[None]:
+    """
+    Fail Reddit calls made inside the block fast once their turn would come after seconds from now
+    """
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+class RedditScheduler:
+    """
+    Token bucket in front of the Reddit API, shared by every request of the process
+
+    Reddit grants a quota of requests per fixed window and reports what is left
+    in the X-Ratelimit-Remaining, -Used and -Reset headers of every response.
+    The bucket refills at the remaining quota spread over the rest of the
+    window, so the quota lasts until the window resets, and holds at most
+    burst tokens. Waiting calls are served by priority, then round-robin
+    across flows; bulk calls leave reserve tokens for interactive ones.
+
+    Args:
+        limit: Requests per window assumed until Reddit's headers arrive
+        window: Seconds per window assumed until Reddit's headers arrive
+        burst: Maximum number of tokens in the bucket
+        max_wait: Default seconds a call may wait before it fails fast
+        reserve: Tokens only interactive calls may use
+    """
+
+    def __init__(
+        self,
+        limit: int = REDDIT_RATE_LIMIT,
+        window: float = REDDIT_RATE_WINDOW,
+        burst: int = REDDIT_BURST,
+        max_wait: float = REDDIT_MAX_QUEUE_WAIT,
+        reserve: int = REDDIT_INTERACTIVE_RESERVE,
+    ):
+        self.limit = max(1, limit)
+        self.window = window
+        self.burst = max(1, burst)
+        self.max_wait = max_wait
+        self.reserve = min(max(0, reserve), self.burst - 1)
+        now = time.monotonic()
+        self.remaining = float(self.limit)
+        self.reset_at = now + window
+        self.tokens = float(min(self.burst, self.limit))
+        self.in_flight = 0
+        self._updated_at = now
+        self._queues: Dict[int, "OrderedDict[Any, Deque[asyncio.Future]]"] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of calls waiting for a token"""
+        return sum(len(queue) for flows in self._queues.values() for queue in flows.values())
+
+    def _refill(self, now: float) -> None:
+        if now >= self.reset_at:
+            # New window; the next response's headers correct the estimate
+            self.remaining = float(self.limit)
+            self.reset_at = now + self.window
+        rate = self.remaining / max(self.reset_at - now, 1e-3)
+        self.tokens = min(self.burst, self.remaining, self.tokens + rate * (now - self._updated_at))
+        self._updated_at = now
+
+    def _wait_time(self, tokens: float, now: float) -> float:
+        """
+        Estimate the seconds until the bucket holds tokens more tokens than now
+        """
+        needed = tokens - self.tokens
+        if needed <= 0:
+            return 0.0
+        seconds_left = max(self.reset_at - now, 1e-3)
+        if needed <= self.remaining - self.tokens:
+            return needed / (self.remaining / seconds_left)
+        # The quota of this window runs out first
+        return seconds_left + (needed - (self.remaining - self.tokens)) * self.window / self.limit
+
+    def _needed(self, priority: int) -> float:
+        """
+        Tokens the bucket must hold before a call of priority may take one
+        """
+        return 1 + (self.reserve if priority != INTERACTIVE else 0)
+
+    def _calls_ahead(self, priority: int, flow: Any) -> int:
+        """
+        Estimate the waiting calls served before a new call of flow, given round-robin across flows
+        """
+        own = self._queues.get(priority, {}).get(flow)
+        position = (len(own) if own else 0) + 1
+        ahead = position - 1
+        for other_priority, flows in self._queues.items():
+            for other_flow, queue in flows.items():
+                if other_priority < priority:
+                    ahead += len(queue)
+                elif other_priority == priority and other_flow != flow:
+                    ahead += min(len(queue), position)
+        return ahead
+
+    async def acquire(self, priority: Optional[int] = None, flow: Any = None, max_wait: Optional[float] = None) -> None:
+        """
+        Wait for a token to send one Reddit request; call release() once it is answered
+
+        Args:
+            priority: INTERACTIVE or BULK (default: the current reddit_flow's)
+            flow: Key of the flow the call belongs to (default: the current reddit_flow's)
+            max_wait: Seconds the call may wait (default: max_wait of the scheduler,
+                or less if the current reddit_deadline comes earlier)
+
+        Raises:
+            RedditRateLimited: If the call would wait longer than max_wait
+        """
+        priority = _priority.get() if priority is None else priority
+        flow = (_flow.get() or asyncio.current_task()) if flow is None else flow
+        max_wait = self.max_wait if max_wait is None else max_wait
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        deadline = _deadline.get()
+        if deadline is not None:
+            max_wait = min(max_wait, deadline - now)
+        self._refill(now)
+
+        if not self.queue_depth and self.tokens >= self._needed(priority):
+            self._grant()
+            reddit_queue_seconds.observe(0.0, priority=PRIORITY_NAMES[priority])
+            return
+
+        wait = self._wait_time(self._calls_ahead(priority, flow) + self._needed(priority), now)
+        if wait > max_wait:
+            reddit_rejected_total.inc(priority=PRIORITY_NAMES[priority])
+            raise RedditRateLimited(wait)
+
+        future = loop.create_future()
+        self._queues.setdefault(priority, OrderedDict()).setdefault(flow, deque()).append(future)
+        self._schedule(loop)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just before the caller gave up; return the token
+                self.in_flight -= 1
+                self.tokens += 1
+                self.remaining += 1
+            self._remove(future, priority, flow)
+            raise
+        reddit_queue_seconds.observe(time.monotonic() - now, priority=PRIORITY_NAMES[priority])
+
+    def release(self, headers: Optional[Mapping[str, str]] = None) -> None:
+        """
+        Mark a request as answered and update the quota from its X-Ratelimit headers
+        """
+        self.in_flight = max(0, self.in_flight - 1)
+        if headers is None or "x-ratelimit-remaining" not in headers:
+            return
+        try:
+            remaining = float(headers["x-ratelimit-remaining"])
+            used = float(headers["x-ratelimit-used"])
+            seconds_to_reset = float(headers["x-ratelimit-reset"])
+        except (KeyError, ValueError):
+            return
+        now = time.monotonic()
+        self._refill(now)
+        self.limit = max(1, int(remaining + used))
+        # Requests still in flight may not be counted by Reddit yet
+        self.remaining = max(0.0, remaining - self.in_flight)
+        self.reset_at = now + seconds_to_reset
+        self.tokens = min(self.tokens, self.remaining)
+        if self.remaining <= 0:
+            logger.warning("Reddit rate limit exhausted, next window in %.0fs", seconds_to_reset)
+
+    def _grant(self) -> None:
+        self.tokens -= 1
+        self.remaining -= 1
+        self.in_flight += 1
+
+    def _remove(self, future: asyncio.Future, priority: int, flow: Any) -> None:
+        flows = self._queues.get(priority)
+        queue = flows.get(flow) if flows else None
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            return
+        if not queue:
+            del flows[flow]
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        for priority in sorted(self._queues):
+            flows = self._queues[priority]
+            if flows and self.tokens < self._needed(priority):
+                # Lower priorities wait too, so the highest one gets the next token
+                return None
+            while flows:
+                flow, queue = next(iter(flows.items()))
+                future = queue.popleft()
+                if queue:
+                    # Round-robin: the flow goes to the back of its priority
+                    flows.move_to_end(flow)
+                else:
+                    del flows[flow]
+                if not future.done():
+                    return future
+        return None
+
+    def _schedule(self, loop: asyncio.AbstractEventLoop) -> None:
+        # A new call may be served sooner than the one the pending timer waits for
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = loop.call_soon(self._dispatch)
+
+    def _dispatch(self) -> None:
+        self._timer = None
+        now = time.monotonic()
+        self._refill(now)
+        while self.tokens >= 1:
+            future = self._next_waiter()
+            if future is None:
+                break
+            self._grant()
+            future.set_result(None)
+        if self.queue_depth:
+            waiting = min(priority for priority, flows in self._queues.items() if flows)
+            delay = max(self._wait_time(self._needed(waiting), now), 0.001)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+
+reddit_scheduler = RedditScheduler()
+metrics.Gauge(
+    "superred_reddit_queue_depth", "Reddit calls waiting for the rate-limit scheduler",
+    function=lambda: reddit_scheduler.queue_depth,
+)
+metrics.Gauge(
+    "superred_reddit_quota_remaining", "Reddit requests left in the current rate-limit window",
+    function=lambda: reddit_scheduler.remaining,
+)
+
+
+class ScheduledRequestor(Requestor):
+    """
+    AsyncPRAW requestor that sends every Reddit HTTP request through the scheduler
+
+    Pass it as requestor_class to asyncpraw.Reddit, then call use_scheduler_pacing
+    on the instance.
+    """
+
+    def __init__(self, *args: Any, scheduler: Optional[RedditScheduler] = None, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.scheduler = scheduler or reddit_scheduler
+
+    async def request(self, *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        await self.scheduler.acquire()
+        response = None
+        try:
+            response = await super().request(*args, timeout=timeout, **kwargs)
+            return response
+        finally:
+            self.scheduler.release(response.headers if response is not None else None)
+
+
+class _UnpacedRateLimiter(RateLimiter):
+    """
+    AsyncPRAW's rate limiter without its sleeps, for sessions whose calls the scheduler paces
+    """
+
+    async def delay(self) -> None:
+        return
+
+
+def use_scheduler_pacing(reddit: Any) -> None:
+    """
+    Stop AsyncPRAW from pacing the calls of reddit itself
+
+    AsyncPRAW sleeps before a call to spread the remaining quota, and until the
+    window resets once it is used up, before the call reaches ScheduledRequestor.
+    Calls the scheduler would turn away then wait out the sleep instead of failing fast.
+    """
+    for name in ("_read_only_core", "_authorized_core"):
+        session = getattr(reddit, name, None)
+        if session is not None:
+            session._rate_limiter = _UnpacedRateLimiter(window_size=session._rate_limiter.window_size)
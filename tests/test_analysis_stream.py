@@ -0,0 +1,97 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from clustering_pool import PoolSaturatedError
+from posts import Post
+
+
+def make_posts():
+    posts = [
+        Post(subreddit="python", id=f"p{i}", title=f"Problem {i}", content=f"Distinct complaint number {i} about {topic}")
+        for i, topic in enumerate(["packaging", "typing", "the GIL", "virtualenvs", "imports", "asyncio"])
+    ]
+    posts.append(Post(subreddit="python", id="x", title="Crossposted", content="From elsewhere", is_crosspost=True))
+    return posts
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """
+    Run /analyze/stream on fake posts, clusters and summaries; no models or network
+    """
+    monkeypatch.setattr(main, "PIPELINE_EMBEDDING", False)
+
+    async def stream_posts_from_subreddits(subreddits, failed, search_limit=30, use_cache=True):
+        failed["missing"] = "Subreddit not found"
+        for post in make_posts():
+            yield post
+
+    async def categorize_posts_async(posts):
+        # The last kept post is not a pain point
+        return {-1: posts[:1], 0: posts[1:3], 1: posts[3:5]}
+
+    async def iter_pain_point_summaries(categorized_posts, use_cache=True):
+        # Categories arrive in order of completion, not of cluster ID
+        for cluster in (1, 0):
+            yield cluster, {"category": f"Category {cluster}", "pain_points": "Problems.", "posts": categorized_posts[cluster]}
+
+    monkeypatch.setattr(main, "stream_posts_from_subreddits", stream_posts_from_subreddits)
+    monkeypatch.setattr(main, "categorize_posts_async", categorize_posts_async)
+    monkeypatch.setattr(main, "iter_pain_point_summaries", iter_pain_point_summaries)
+    # Not entered as a context manager, so the lifespan (model warm-up, pool start) is skipped
+    return TestClient(main.app)
+
+
+def stream(client, **body):
+    response = client.post("/analyze/stream", json={"subreddits": ["python", "missing"], **body})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_stream_events_arrive_in_pipeline_order(client):
+    events = stream(client)
+
+    assert [event["event"] for event in events] == [
+        "posts_fetched", "posts_filtered", "clusters_found", "category", "category", "done",
+    ]
+    assert events[0]["total_posts"] == 7
+    assert events[0]["failed_subreddits"] == {"missing": "Subreddit not found"}
+    assert events[1]["kept"] == 6
+    assert events[1]["filtered"]["crossposts"] == 1
+    assert events[2] == {"event": "clusters_found", "clusters": 2, "outliers": 1, "not_pain_points": 1}
+    assert [event["cluster_id"] for event in events[3:5]] == [1, 0]
+    assert events[-1] == {"event": "done", "categories": 2}
+
+
+def test_stream_posts_are_slim_unless_content_is_requested(client):
+    slim = stream(client)[3]["category"]["posts"][0]
+    full = stream(client, include_content=True)[3]["category"]["posts"][0]
+
+    assert "snippet" in slim and "content" not in slim
+    assert full["content"].startswith("Distinct complaint")
+
+
+def test_stream_ends_with_an_error_event_when_the_pool_is_saturated(client, monkeypatch):
+    async def categorize_posts_async(posts):
+        raise PoolSaturatedError("Clustering pool is saturated")
+
+    monkeypatch.setattr(main, "categorize_posts_async", categorize_posts_async)
+
+    events = stream(client)
+
+    assert [event["event"] for event in events] == ["posts_fetched", "posts_filtered", "error"]
+    assert events[-1]["status_code"] == 429
+
+
+def test_analyze_collects_the_stream_into_one_response(client):
+    response = client.post("/analyze", json={"subreddits": ["python", "missing"]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert list(body["categories"]) == ["0", "1"]
+    assert body["total_posts"] == 7
+    assert body["filtered"]["not_pain_points"] == 1
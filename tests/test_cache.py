@@ -0,0 +1,80 @@
+from cache import PersistentCache, SummaryCache, TTLCache
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert len(cache) == 2
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("fresh", 1)
+    cache.set("stale", 2, ttl=-1)
+
+    assert cache.get("fresh") == 1
+    assert cache.get("stale", "missing") == "missing"
+    assert cache.pop("fresh") == 1
+    assert cache.get("fresh") is None
+
+
+def test_persistent_cache_survives_restarts(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    PersistentCache(path).set("key", {"posts": [1, 2]})
+
+    assert PersistentCache(path).get("key") == {"posts": [1, 2]}
+    assert PersistentCache(path).get("missing", "default") == "default"
+
+
+def test_persistent_cache_expires_entries_on_disk(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    PersistentCache(path, ttl=-1).set("key", "value")
+
+    assert PersistentCache(path).get("key") is None
+
+
+def test_persistent_cache_evicts_least_recently_used_on_disk(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = PersistentCache(path, disk_maxsize=2)
+    cache.EVICT_EVERY = 1
+    cache.set("a", 1)
+    cache.set("b", 2)
+    # Reading through a fresh memory tier marks "a" as used on disk
+    assert PersistentCache(path).get("a") == 1
+
+    cache.set("c", 3)
+
+    reopened = PersistentCache(path)
+    assert (reopened.get("a"), reopened.get("b"), reopened.get("c")) == (1, None, 3)
+
+
+def test_summary_cache_matches_overlapping_clusters(tmp_path):
+    cache = SummaryCache(str(tmp_path / "summaries.sqlite3"))
+    members = [f"post{i}" for i in range(10)]
+    cache.set(members, "model:1", {"category": "Crashes"})
+
+    # Exact matches ignore order; 9 of 10 shared posts is a Jaccard overlap of 0.9
+    assert cache.match(list(reversed(members)), "model:1") == ({"category": "Crashes"}, 1.0)
+    assert cache.match(members[:9], "model:1", min_jaccard=0.8) == ({"category": "Crashes"}, 0.9)
+    assert cache.get(members[:9], "model:1") is None
+    assert cache.get(members[:5], "model:1", min_jaccard=0.8) is None
+    # Summaries of another model or prompt version are never reused
+    assert cache.get(members, "model:2", min_jaccard=0.5) is None
+
+
+def test_summary_cache_prefers_the_closest_cluster(tmp_path):
+    cache = SummaryCache(str(tmp_path / "summaries.sqlite3"))
+    cache.set([f"post{i}" for i in range(10)], "model:1", {"category": "Wide"})
+    cache.set([f"post{i}" for i in range(5)], "model:1", {"category": "Narrow"})
+
+    value, overlap = cache.match([f"post{i}" for i in range(6)], "model:1", min_jaccard=0.5)
+
+    assert value == {"category": "Narrow"}
+    assert round(overlap, 3) == 0.833
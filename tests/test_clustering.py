@@ -0,0 +1,90 @@
+import numpy as np
+
+from clustering import (
+    agglomerative_labels, assign_to_centroids, cluster_centroids, kmeans_labels, merge_clusters, normalize, relabel,
+)
+
+DIMENSIONS = 32
+
+
+def blobs(sizes, spread=0.1, seed=0):
+    """
+    Embeddings in well separated groups of the given sizes, in order
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(len(sizes), DIMENSIONS))
+    return np.vstack([center + spread * rng.normal(size=(size, DIMENSIONS)) for center, size in zip(centers, sizes)])
+
+
+def groups(labels, sizes):
+    """
+    The set of labels given to each group of blobs(sizes)
+    """
+    bounds = np.cumsum([0] + list(sizes))
+    return [set(labels[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def test_normalize_gives_unit_rows():
+    normed = normalize(np.array([[3.0, 4.0], [0.0, 0.0]]))
+    np.testing.assert_allclose(normed[0], [0.6, 0.8])
+    np.testing.assert_allclose(normed[1], [0.0, 0.0])
+
+
+def test_relabel_numbers_by_size_and_marks_small_clusters():
+    labels = relabel(np.array([7, 7, 3, 3, 3, 9]), min_cluster_size=2)
+    assert labels == [1, 1, 0, 0, 0, -1]
+
+
+def test_merge_clusters_stops_at_threshold():
+    similarity = np.array([
+        [1.0, 0.9, 0.1],
+        [0.9, 1.0, 0.2],
+        [0.1, 0.2, 1.0],
+    ])
+    labels = merge_clusters(similarity, np.ones(3), threshold=0.5)
+    assert labels[0] == labels[1] != labels[2]
+
+
+def test_agglomerative_labels_finds_groups():
+    sizes = [6, 4, 1]
+    labels = agglomerative_labels(blobs(sizes), threshold=0.5, min_cluster_size=2)
+
+    # Largest group first; the single post is an outlier
+    assert groups(labels, sizes) == [{0}, {1}, {-1}]
+
+
+def test_kmeans_labels_finds_groups():
+    sizes = [120, 80, 50]
+    embeddings = blobs(sizes)
+
+    labels = kmeans_labels(embeddings, threshold=0.5)
+
+    assert groups(labels, sizes) == [{0}, {1}, {2}]
+    # Seeded, so repeated runs agree
+    assert kmeans_labels(embeddings, threshold=0.5) == labels
+
+
+def test_kmeans_labels_marks_small_clusters_as_outliers():
+    sizes = [60, 40, 1]
+    labels = kmeans_labels(blobs(sizes), n_clusters=3, threshold=0.5, min_cluster_size=2)
+    assert groups(labels, sizes) == [{0}, {1}, {-1}]
+
+
+def test_assign_to_centroids_reproduces_fit():
+    sizes = [60, 40]
+    embeddings = blobs(sizes)
+    labels = kmeans_labels(embeddings, threshold=0.5)
+
+    assert assign_to_centroids(embeddings, cluster_centroids(embeddings, labels), threshold=0.5) == labels
+
+
+def test_assign_to_centroids_marks_unlike_documents_as_outliers():
+    sizes = [60, 40, 5]
+    embeddings = blobs(sizes)
+    # Centroids of the first two groups only
+    centroids = cluster_centroids(embeddings[:100], kmeans_labels(embeddings[:100], threshold=0.5))
+
+    labels = assign_to_centroids(embeddings, centroids, threshold=0.5)
+
+    assert groups(labels, sizes) == [{0}, {1}, {-1}]
+    assert assign_to_centroids(embeddings, centroids[:0]) == [-1] * len(embeddings)
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from clustering_pool import ClusteringPool, PoolSaturatedError
+
+
+def thread_pool(workers, max_queue, max_background=0):
+    """
+    ClusteringPool running its jobs on threads, so tests need no worker processes
+    """
+    pool = ClusteringPool(workers=workers, max_queue=max_queue, max_background=max_background)
+    pool._executor = ThreadPoolExecutor(max_workers=workers)
+    return pool
+
+
+def test_jobs_beyond_the_workers_and_queue_are_turned_away():
+    async def run():
+        pool = thread_pool(workers=1, max_queue=1, max_background=1)
+        release = threading.Event()
+        accepted = [asyncio.create_task(pool.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert (pool.pending, pool.queue_depth) == (2, 1)
+
+        with pytest.raises(PoolSaturatedError):
+            await pool.run(release.wait)
+        # Background jobs have their own capacity
+        background = asyncio.create_task(pool.run(release.wait, background=True))
+        await asyncio.sleep(0)
+        with pytest.raises(PoolSaturatedError):
+            await pool.run(release.wait, background=True)
+
+        release.set()
+        assert await asyncio.gather(*accepted, background) == [True, True, True]
+        assert pool.pending == 0
+        pool.shutdown()
+
+    asyncio.run(run())
+
+
+def raise_broken_pool():
+    raise BrokenProcessPool("A worker died")
+
+
+def test_a_broken_pool_is_shut_down_and_replaced():
+    async def run():
+        pool = thread_pool(workers=1, max_queue=0)
+        broken = pool._executor
+
+        with pytest.raises(BrokenProcessPool):
+            await pool.run(raise_broken_pool)
+
+        assert pool._executor is None
+        assert broken._shutdown
+        assert pool.pending == 0
+
+    asyncio.run(run())
+
+
+def test_analyze_answers_429_when_the_pool_is_saturated(monkeypatch):
+    async def stream_posts_from_subreddits(subreddits, failed, search_limit=30, use_cache=True):
+        return
+        yield
+
+    async def categorize_posts_async(posts):
+        raise PoolSaturatedError("Clustering pool is saturated (10 jobs in progress), try again later")
+
+    monkeypatch.setattr(main, "PIPELINE_EMBEDDING", False)
+    monkeypatch.setattr(main, "stream_posts_from_subreddits", stream_posts_from_subreddits)
+    monkeypatch.setattr(main, "categorize_posts_async", categorize_posts_async)
+
+    response = TestClient(main.app).post("/analyze", json={"subreddits": ["python"]})
+
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "5"
+    assert "saturated" in response.json()["detail"]
@@ -0,0 +1,78 @@
+import random
+
+import filtering
+from filtering import drop_reason, duplicate_key, filter_posts, find_near_duplicates, has_body, post_text
+from posts import Post
+
+WORDS = (
+    "every time i try to install the package pip fails with a dependency conflict and the resolver "
+    "gives up after an hour so the whole build is stuck until someone pins the versions by hand"
+).split()
+
+
+def test_has_body_and_post_text():
+    assert has_body(Post("python", "Title", "Body"))
+    for body in ("", "  ", "[removed]", "[deleted]"):
+        post = Post("python", "Title", body)
+        assert not has_body(post)
+        assert post_text(post) == "Title"
+
+
+def test_drop_reason(monkeypatch):
+    monkeypatch.setattr(filtering, "FILTER_CROSSPOSTS", True)
+    monkeypatch.setattr(filtering, "FILTER_EMPTY_BODY", "backfill")
+    assert drop_reason(Post("python", "Title", "Body")) is None
+    assert drop_reason(Post("python", "Title", "Body", is_crosspost=True)) == "crossposts"
+    assert drop_reason(Post("python", "Title", "[removed]")) is None
+    assert drop_reason(Post("python", " ", "[removed]")) == "empty_dropped"
+
+    monkeypatch.setattr(filtering, "FILTER_EMPTY_BODY", "drop")
+    assert drop_reason(Post("python", "Title", "[deleted]")) == "empty_dropped"
+
+    monkeypatch.setattr(filtering, "FILTER_CROSSPOSTS", False)
+    assert drop_reason(Post("python", "Title", "Body", is_crosspost=True)) is None
+
+
+def test_duplicate_key_ignores_case_and_punctuation():
+    post = Post("python", "Pip is broken", "It fails, every time!")
+    assert duplicate_key(post) == duplicate_key(Post("devops", "pip IS broken", "it fails every time"))
+    assert duplicate_key(post) != duplicate_key(Post("python", "Pip is broken", "It works every time"))
+
+
+def test_find_near_duplicates_keeps_first_of_each_group():
+    text = " ".join(WORDS)
+    # One word changed out of 35 leaves most shingles shared
+    edited = text.replace("hour", "afternoon")
+    shuffled = list(WORDS)
+    random.Random(0).shuffle(shuffled)
+    texts = [text, " ".join(shuffled), edited, "a completely different complaint about slow ci runners"]
+
+    assert find_near_duplicates(texts, threshold=0.8) == [2]
+    assert find_near_duplicates(texts, threshold=1.0) == []
+    assert find_near_duplicates([]) == []
+
+
+def test_filter_posts_counts_every_reason(monkeypatch):
+    monkeypatch.setattr(filtering, "FILTER_CROSSPOSTS", True)
+    monkeypatch.setattr(filtering, "FILTER_EMPTY_BODY", "backfill")
+    monkeypatch.setattr(filtering, "FILTER_NEAR_DUPLICATE_THRESHOLD", 0.8)
+    text = " ".join(WORDS)
+    posts = [
+        Post("python", "Pip conflicts", text),
+        Post("python", "Pip conflicts", text.upper()),
+        Post("devops", "Pip conflicts again", text.replace("hour", "afternoon")),
+        Post("python", "Crosspost", "Some body", is_crosspost=True),
+        Post("python", "Link post about flaky deploys", ""),
+        Post("python", "", "[removed]"),
+    ]
+
+    kept, stats = filter_posts(posts)
+
+    assert kept == [posts[0], posts[4]]
+    assert stats == {
+        "crossposts": 1,
+        "empty_dropped": 1,
+        "empty_backfilled": 1,
+        "exact_duplicates": 1,
+        "near_duplicates": 1,
+    }
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+import get_data
+from benchmarks.fakes import FakeReddit, FakeSubreddit, synthetic_fixtures
+from cache import PersistentCache
+
+SUBREDDITS = ["alpha", "beta", "gamma", "delta"]
+
+
+class TrackingReddit(FakeReddit):
+    """
+    FakeReddit that records how many searches run at the same time, with slower subreddits
+    """
+
+    def __init__(self, fixtures, latency=0.0, slow=None):
+        super().__init__(fixtures, latency)
+        self.slow = {name.lower(): seconds for name, seconds in (slow or {}).items()}
+        self.searches = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def subreddit(self, name):
+        subreddit = await super().subreddit(name)
+        latency = self.slow.get(name.lower(), self.latency)
+        search = FakeSubreddit(name, subreddit._posts, latency).search
+        reddit = self
+
+        class Tracked:
+            async def search(self, *args, **kwargs):
+                reddit.searches += 1
+                reddit.active += 1
+                reddit.max_active = max(reddit.max_active, reddit.active)
+                try:
+                    async for post in search(*args, **kwargs):
+                        yield post
+                finally:
+                    reddit.active -= 1
+
+        return Tracked()
+
+
+@pytest.fixture
+def reddit(tmp_path, monkeypatch):
+    """
+    Serve get_data's searches from a TrackingReddit; set its attributes to shape the test
+    """
+    monkeypatch.setattr(get_data, "post_cache", PersistentCache(str(tmp_path / "posts.sqlite3")))
+    fake = TrackingReddit(synthetic_fixtures(SUBREDDITS, 10), latency=0.05)
+    monkeypatch.setattr(get_data, "_shared_reddit", fake)
+    return fake
+
+
+def test_fetches_subreddits_concurrently_in_request_order(reddit):
+    posts, failed = asyncio.run(get_data.get_posts_from_subreddits(SUBREDDITS, search_limit=10, max_concurrency=2))
+
+    assert failed == {}
+    assert [post.subreddit for post in posts] == [name for name in SUBREDDITS for _ in range(10)]
+    assert reddit.max_active == 2
+
+
+def test_reports_failed_and_timed_out_subreddits(reddit):
+    reddit.slow = {"beta": 5.0}
+
+    posts, failed = asyncio.run(get_data.get_posts_from_subreddits(
+        ["alpha", "beta", "missing"], search_limit=10, timeout=0.5
+    ))
+
+    assert {post.subreddit for post in posts} == {"alpha"}
+    assert failed["beta"] == "Timed out after 0.5 seconds"
+    assert "missing" in failed["missing"]
+
+
+def test_stream_keeps_posts_of_a_subreddit_that_times_out_later(reddit, monkeypatch):
+    # Two pages: the first arrives, the second does not before the timeout
+    monkeypatch.setattr(get_data, "_shared_reddit", TrackingReddit(synthetic_fixtures(["alpha"], 150), slow={"alpha": 0.3}))
+
+    async def collect():
+        failed = {}
+        posts = [post async for post in get_data.stream_posts_from_subreddits(["alpha"], failed, search_limit=150, timeout=0.45)]
+        return posts, failed
+
+    posts, failed = asyncio.run(collect())
+
+    assert len(posts) == 100
+    assert "alpha" in failed
+
+
+def test_repeated_searches_are_served_from_the_post_cache(reddit):
+    first, _ = asyncio.run(get_data.get_posts_from_subreddits(["alpha", "beta"], search_limit=10))
+    again, _ = asyncio.run(get_data.get_posts_from_subreddits(["Alpha", "beta"], search_limit=10))
+
+    assert reddit.searches == 2
+    assert [post.id for post in again] == [post.id for post in first]
+    # Cached posts carry the subreddit name as the request spelled it
+    assert {post.subreddit for post in again[:10]} == {"Alpha"}
+
+    asyncio.run(get_data.get_posts_from_subreddits(["alpha"], search_limit=10, use_cache=False))
+    assert reddit.searches == 3
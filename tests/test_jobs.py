@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from jobs import JobManager, JobQueueFullError
+
+
+async def noop():
+    return None
+
+
+def test_submitting_the_same_key_joins_the_in_flight_job():
+    async def run():
+        manager = JobManager(workers=1, max_queue=10)
+        release = asyncio.Event()
+        runs = []
+
+        async def analyze():
+            runs.append(1)
+            await release.wait()
+            return {"categories": 3}
+
+        first = manager.submit("python|crash", analyze)
+        await asyncio.sleep(0)
+        assert first.status == "running"
+        assert manager.submit("python|crash", analyze) is first
+        other = manager.submit("rust|crash", analyze)
+        assert other is not first
+
+        release.set()
+        while other.status != "succeeded":
+            await asyncio.sleep(0.01)
+        # A finished job no longer absorbs new submissions
+        assert manager.submit("python|crash", noop) is not first
+        await manager.stop()
+
+        assert runs == [1, 1]
+        assert first.status == "succeeded"
+        assert manager.get(first.id).result == {"categories": 3}
+
+    asyncio.run(run())
+
+
+def test_failed_jobs_record_the_error():
+    async def run():
+        manager = JobManager(workers=1)
+
+        async def fail():
+            raise RuntimeError("Reddit is down")
+
+        job = manager.submit("python|crash", fail)
+        while job.finished_at is None:
+            await asyncio.sleep(0.01)
+        await manager.stop()
+        return job
+
+    job = asyncio.run(run())
+
+    assert (job.status, job.error) == ("failed", "Reddit is down")
+
+
+def test_a_full_queue_rejects_new_jobs():
+    async def run():
+        manager = JobManager(workers=1, max_queue=1)
+        release = asyncio.Event()
+        manager.submit("running", release.wait)
+        await asyncio.sleep(0)
+        manager.submit("waiting", release.wait)
+
+        with pytest.raises(JobQueueFullError):
+            manager.submit("rejected", release.wait)
+        # Joining a queued job still works
+        assert manager.submit("waiting", release.wait).key == "waiting"
+        assert manager.queue_depth == 1
+        await manager.stop()
+
+    asyncio.run(run())
+
+
+def test_finished_jobs_expire_after_the_result_ttl():
+    async def run():
+        manager = JobManager(workers=1, result_ttl=-1)
+        job = manager.submit("python|crash", noop)
+        while job.finished_at is None:
+            await asyncio.sleep(0.01)
+        manager.submit("rust|crash", noop)
+        await manager.stop()
+        return manager, job
+
+    manager, job = asyncio.run(run())
+
+    assert manager.get(job.id) is None
@@ -0,0 +1,58 @@
+from keywords import ctfidf_keywords, extractive_summary, keyword_label, label_clusters
+from posts import Post
+
+
+def test_ctfidf_favors_words_specific_to_a_cluster():
+    keywords = ctfidf_keywords({
+        0: ["battery drains overnight", "battery drains fast after the update", "app update broke sync"],
+        1: ["login fails with two factor", "login page loops after the update"],
+        2: ["the and of"],
+    })
+
+    assert keywords[0][0][0] in ("battery", "drains", "battery drains")
+    assert keywords[1][0][0] == "login"
+    # Shared by both clusters, so it ranks below the words of each
+    assert "update" not in [term for term, _ in keywords[0][:3]]
+    assert all(weight > 0 for terms in keywords.values() for _, weight in terms)
+    assert keywords[2] == []
+    assert ctfidf_keywords({0: []}) == {}
+
+
+def test_keyword_label_merges_phrases_and_skips_overlaps():
+    keywords = [("battery", 0.9), ("drain", 0.8), ("battery drain", 0.7), ("charger", 0.6), ("battery life", 0.5)]
+
+    assert keyword_label(keywords) == "Battery drain, charger"
+    assert keyword_label([("login", 1.0), ("sync", 0.9), ("crash", 0.8)], max_keywords=2) == "Login, sync"
+    assert keyword_label([]) == "Uncategorized"
+
+
+def test_extractive_summary_picks_distinct_keyword_sentences():
+    posts = [
+        Post(subreddit="android", title="Help", content="My battery drains overnight since the update. I like the new icons."),
+        Post(subreddit="android", title="Same here", content="The battery drains overnight since the update, every night."),
+        Post(subreddit="android", title="Charger", content="The charger stopped charging the battery at all."),
+    ]
+    keywords = [("battery", 0.5), ("drains", 0.4), ("overnight", 0.4), ("charger", 0.3), ("charging", 0.3)]
+
+    summary = extractive_summary(posts, keywords)
+
+    assert summary.startswith("My battery drains overnight since the update.")
+    assert "every night" not in summary
+    assert "charger" in summary.lower()
+    assert "icons" not in summary
+    assert extractive_summary([Post(subreddit="android", title="Hi", content="")], keywords) == "No clear pain points identified."
+
+
+def test_label_clusters_names_every_cluster_but_outliers():
+    categorized = {
+        -1: [Post(subreddit="android", title="Random question about wallpapers", content="")],
+        0: [Post(subreddit="android", title="Battery drains overnight", content="The battery drains overnight after updating.")],
+        1: [Post(subreddit="android", title="Login fails", content="Login fails every time with two factor codes.")],
+    }
+
+    categories = label_clusters(categorized)
+
+    assert list(categories) == [0, 1]
+    assert "Login" in categories[1]["category"]
+    assert categories[0]["posts"] is categorized[0]
+    assert categories[0]["pain_points"].endswith(".")
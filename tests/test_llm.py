@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+from google.genai import errors
+
+import llm
+import utils
+from benchmarks.fakes import StubLLMServer
+from metrics import llm_requests_total
+from posts import Post
+
+
+class FlakyLLMServer(StubLLMServer):
+    """
+    StubLLMServer that answers the first failures requests with a status code
+    """
+
+    def __init__(self, failures, status=503, latency=0.0):
+        super().__init__(latency)
+        self.failures = failures
+        self.status = status
+        self.active = 0
+        self.max_active = 0
+
+    async def _generate_content(self, request):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            if self.failures > 0:
+                self.failures -= 1
+                await request.read()
+                return web.json_response({"error": {"code": self.status, "message": "Unavailable", "status": "UNAVAILABLE"}}, status=self.status)
+            return await super()._generate_content(request)
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture
+def llm_server(monkeypatch):
+    """
+    Point the Gemini client at a fake server; call the fixture with the server to start it
+    """
+    started = []
+    monkeypatch.setattr(llm, "GEMINI_API_KEY", "test")
+    monkeypatch.setattr(llm, "LLM_RETRY_BASE_DELAY", 0.01)
+
+    async def start(server, max_concurrency=5):
+        await server.start()
+        monkeypatch.setattr(llm, "GEMINI_BASE_URL", server.base_url)
+        monkeypatch.setattr(llm, "llm_limiter", llm.RateLimiter(max_concurrency, requests_per_minute=0))
+        llm.get_genai_client.cache_clear()
+        started.append(server)
+        return server
+
+    yield start
+    llm.get_genai_client.cache_clear()
+
+
+def posts(name):
+    return [Post(subreddit="python", title=f"{name} {i}", content=f"{name} body {i}") for i in range(3)]
+
+
+def test_summaries_stay_within_the_concurrency_limit(llm_server):
+    async def run():
+        server = await llm_server(FlakyLLMServer(failures=0, latency=0.2), max_concurrency=2)
+        try:
+            start = time.monotonic()
+            categories = await asyncio.gather(*(utils.summarize_cluster(posts(f"cluster{i}")) for i in range(6)))
+            elapsed = time.monotonic() - start
+        finally:
+            await server.stop()
+
+        assert server.max_active == 2
+        # Six calls two at a time take three rounds
+        assert elapsed >= 0.55
+        assert {category.pain_points for category in categories} == {"Users report recurring problems."}
+
+    asyncio.run(run())
+
+
+def test_server_errors_are_retried(llm_server):
+    async def run():
+        server = await llm_server(FlakyLLMServer(failures=2))
+        retries = llm_requests_total.value(outcome="retry")
+        try:
+            category = await utils.summarize_cluster(posts("crash"))
+        finally:
+            await server.stop()
+
+        assert category.category.startswith("Stub category")
+        assert llm_requests_total.value(outcome="retry") - retries == 2
+
+    asyncio.run(run())
+
+
+def test_client_errors_are_not_retried(llm_server):
+    async def run():
+        server = await llm_server(FlakyLLMServer(failures=5, status=400))
+        try:
+            with pytest.raises(errors.ClientError):
+                await utils.summarize_cluster(posts("crash"))
+        finally:
+            await server.stop()
+
+        assert server.failures == 4
+
+    asyncio.run(run())
+
+
+def test_slow_clusters_are_skipped_after_the_timeout(llm_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "summary_cache", utils.SummaryCache(str(tmp_path / "summaries.sqlite3")))
+    monkeypatch.setattr(utils, "LLM_BATCH_SUMMARIES", False)
+
+    async def run():
+        server = await llm_server(StubLLMServer(latency=1.0))
+        try:
+            start = time.monotonic()
+            categories = await utils.summarize_pain_points({0: posts("crash"), 1: posts("login")}, timeout=0.2)
+            elapsed = time.monotonic() - start
+        finally:
+            await server.stop()
+
+        assert categories == {}
+        assert elapsed < 1.0
+
+    asyncio.run(run())
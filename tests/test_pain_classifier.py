@@ -0,0 +1,81 @@
+import re
+import zlib
+
+import numpy as np
+import pytest
+
+import pain_classifier
+import utils
+from pain_classifier import OTHER_PROTOTYPES, PAIN_PROTOTYPES, PainPointClassifier, fit_head, load_head, save_head
+from posts import Post
+
+DIMENSIONS = 512
+STOP_WORDS = {"i", "a", "the", "and", "is", "it", "this", "to", "of", "my", "on", "with", "for", "here", "that"}
+
+PAIN_TEXTS = [
+    "The app crashed again and I lost all my work, so frustrated.",
+    "Why is this so slow and buggy? It keeps breaking every day.",
+    "Customer support ignored me for weeks and I was charged twice.",
+]
+OTHER_TEXTS = [
+    "Thank you all, this community is awesome!",
+    "Here is a tutorial on how to get started with the new release.",
+    "Check out this interesting article I found about the project.",
+]
+
+
+def stub_embed(texts):
+    """
+    Bag-of-words embedding: texts sharing words are similar, like a sentence model on these examples
+    """
+    vectors = np.zeros((len(texts), DIMENSIONS), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in re.findall(r"[a-z]+", text.lower()):
+            if word not in STOP_WORDS:
+                vectors[row, zlib.crc32(word.encode()) % DIMENSIONS] += 1.0
+    return vectors
+
+
+def test_prototypes_separate_pain_points_at_threshold():
+    classifier = PainPointClassifier(stub_embed(PAIN_PROTOTYPES), stub_embed(OTHER_PROTOTYPES))
+
+    pain_scores = classifier.score(stub_embed(PAIN_TEXTS))
+    other_scores = classifier.score(stub_embed(OTHER_TEXTS))
+
+    assert (pain_scores >= pain_classifier.PAIN_SCORE_THRESHOLD).all()
+    assert (other_scores < pain_classifier.PAIN_SCORE_THRESHOLD).all()
+
+
+def test_keep_pain_points_drops_other_posts(monkeypatch):
+    monkeypatch.setattr(utils, "embed_texts", stub_embed)
+    monkeypatch.setattr(utils, "PAIN_CLASSIFIER_HEAD", "")
+    monkeypatch.setattr(utils, "PAIN_SCORE_THRESHOLD", 0.3)
+    posts = [Post("test", text, "") for text in PAIN_TEXTS + OTHER_TEXTS]
+
+    kept, embeddings = utils.keep_pain_points(posts, stub_embed([post.title for post in posts]))
+
+    assert [post.title for post in kept] == PAIN_TEXTS
+    assert len(embeddings) == len(PAIN_TEXTS)
+    assert all(post.pain_score >= 0.3 for post in kept)
+
+
+def test_head_round_trip_scores_like_fitted_head(tmp_path):
+    embeddings = stub_embed(PAIN_PROTOTYPES + OTHER_PROTOTYPES)
+    labels = np.array([1] * len(PAIN_PROTOTYPES) + [0] * len(OTHER_PROTOTYPES))
+    weights, bias = fit_head(embeddings, labels)
+    path = str(tmp_path / "head.npz")
+
+    save_head(path, weights, bias)
+    head = load_head(path)
+
+    assert head is not None
+    np.testing.assert_allclose(head[0], weights)
+    assert head[1] == pytest.approx(bias)
+    classifier = PainPointClassifier(embeddings[:1], embeddings[-1:], head=head)
+    scores = classifier.score(embeddings)
+    assert ((scores >= 0.5) == (labels == 1)).all()
+
+
+def test_load_head_without_file():
+    assert load_head("") is None
+    assert load_head("/nonexistent/head.npz") is None
@@ -0,0 +1,200 @@
+import asyncio
+import time
+
+import asyncpraw
+import pytest
+
+import get_data
+from benchmarks.fakes import FakeRedditServer, synthetic_fixtures
+from cache import PersistentCache
+from reddit_scheduler import BULK, INTERACTIVE, RedditRateLimited, RedditScheduler, ScheduledRequestor, use_scheduler_pacing
+
+# A quota that refills about one token per 100 seconds, so tests only see the initial burst
+SLOW = {"limit": 6, "window": 600}
+
+
+async def acquire_in_order(scheduler, calls):
+    """
+    Queue (name, priority, flow) calls and return their names in the order they were granted
+    """
+    granted = []
+
+    async def call(name, priority, flow):
+        await scheduler.acquire(priority=priority, flow=flow, max_wait=3600)
+        granted.append(name)
+
+    tasks = []
+    for name, priority, flow in calls:
+        tasks.append(asyncio.create_task(call(name, priority, flow)))
+        # Let the call reach the queue before the next one arrives
+        await asyncio.sleep(0)
+    return granted, tasks
+
+
+def test_burst_is_served_right_away_then_calls_fail_fast():
+    async def run():
+        scheduler = RedditScheduler(burst=3, reserve=0, max_wait=5, **SLOW)
+        for _ in range(3):
+            await asyncio.wait_for(scheduler.acquire(priority=BULK, flow="a"), timeout=1)
+        assert scheduler.in_flight == 3
+
+        with pytest.raises(RedditRateLimited) as error:
+            await scheduler.acquire(priority=BULK, flow="a")
+        assert error.value.retry_after > 5
+        assert scheduler.queue_depth == 0
+
+    asyncio.run(run())
+
+
+def test_bulk_calls_leave_the_reserve_to_interactive_ones():
+    async def run():
+        scheduler = RedditScheduler(burst=3, reserve=2, **SLOW)
+        await scheduler.acquire(priority=BULK, flow="bulk")
+
+        # Two tokens are left: too few for bulk calls, enough for interactive ones
+        with pytest.raises(RedditRateLimited):
+            await scheduler.acquire(priority=BULK, flow="bulk", max_wait=1)
+        await asyncio.wait_for(scheduler.acquire(priority=INTERACTIVE, flow="search"), timeout=1)
+
+    asyncio.run(run())
+
+
+def test_waiting_calls_are_served_by_priority_then_round_robin():
+    async def run():
+        scheduler = RedditScheduler(burst=1, reserve=0, **SLOW)
+        await scheduler.acquire(priority=BULK, flow="a")
+        granted, tasks = await acquire_in_order(scheduler, [
+            ("a1", BULK, "a"), ("a2", BULK, "a"), ("a3", BULK, "a"),
+            ("b1", BULK, "b"),
+            ("search", INTERACTIVE, "search"),
+        ])
+
+        # Hand out one token per step instead of waiting for the slow refill
+        for _ in tasks:
+            scheduler.tokens += 1
+            scheduler.remaining += 1
+            scheduler._dispatch()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+        assert granted == ["search", "a1", "b1", "a2", "a3"]
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiters_leave_the_queue():
+    async def run():
+        scheduler = RedditScheduler(burst=1, reserve=0, **SLOW)
+        await scheduler.acquire(priority=BULK, flow="a")
+        waiter = asyncio.create_task(scheduler.acquire(priority=BULK, flow="a", max_wait=600))
+        await asyncio.sleep(0)
+        assert scheduler.queue_depth == 1
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.queue_depth == 0
+
+    asyncio.run(run())
+
+
+def test_release_adopts_the_quota_reported_by_reddit():
+    scheduler = RedditScheduler(limit=600, window=600, burst=60)
+    scheduler.in_flight = 2
+    scheduler.release({"x-ratelimit-remaining": "10", "x-ratelimit-used": "90", "x-ratelimit-reset": "30"})
+
+    assert scheduler.limit == 100
+    # The other request in flight may not be counted by Reddit yet
+    assert scheduler.remaining == 9
+    assert scheduler.tokens <= 9
+    assert scheduler.in_flight == 1
+
+
+@pytest.fixture
+def fake_reddit(tmp_path, monkeypatch):
+    """
+    Point get_data at a FakeRedditServer through a scheduled asyncpraw client
+
+    Yields a function (limit, burst, max_wait) -> (server, scheduler) to start
+    the server; it is stopped after the test.
+    """
+    monkeypatch.setattr(get_data, "post_cache", PersistentCache(str(tmp_path / "posts.sqlite3")))
+    started = []
+
+    async def start(limit, burst, max_wait):
+        server = FakeRedditServer(synthetic_fixtures(["alpha", "beta", "gamma"], 30), limit=limit, window=600)
+        await server.start()
+        scheduler = RedditScheduler(limit=limit, window=600, burst=burst, max_wait=max_wait, reserve=0)
+        reddit = asyncpraw.Reddit(
+            client_id="test",
+            client_secret="test",
+            user_agent="superred tests",
+            oauth_url=server.base_url,
+            reddit_url=server.base_url,
+            check_for_updates=False,
+            requestor_class=ScheduledRequestor,
+            requestor_kwargs={"scheduler": scheduler},
+        )
+        use_scheduler_pacing(reddit)
+        monkeypatch.setattr(get_data, "_shared_reddit", reddit)
+        started.append(server)
+        return server, scheduler
+
+    yield start
+    for server in started:
+        asyncio.run(server.stop())
+
+
+def test_fetches_through_the_scheduler_without_429s(fake_reddit):
+    async def run():
+        server, scheduler = await fake_reddit(limit=10, burst=10, max_wait=5)
+        try:
+            posts, failed = await get_data.get_posts_from_subreddits(["alpha", "beta", "gamma"], search_limit=30)
+        finally:
+            await get_data.close_reddit()
+
+        assert failed == {}
+        assert len(posts) == 90
+        assert server.throttled == 0
+        # The quota now comes from the fake's X-Ratelimit headers
+        assert scheduler.limit == 10
+        assert scheduler.remaining == 10 - server.requests
+
+    asyncio.run(run())
+
+
+def test_turns_calls_away_before_reddit_would_answer_429(fake_reddit):
+    async def run():
+        # The OAuth token request and one search use up both tokens
+        server, scheduler = await fake_reddit(limit=2, burst=2, max_wait=1)
+        start = time.monotonic()
+        try:
+            posts, failed = await get_data.get_posts_from_subreddits(
+                ["alpha", "beta", "gamma"], search_limit=30, max_concurrency=1
+            )
+        finally:
+            await get_data.close_reddit()
+
+        # Turned away right away rather than after AsyncPRAW's own pacing sleep
+        assert time.monotonic() - start < 2
+        assert {post.subreddit for post in posts} == {"alpha"}
+        assert sorted(failed) == ["beta", "gamma"]
+        assert all("rate limit" in error for error in failed.values())
+        assert server.throttled == 0
+
+    asyncio.run(run())
+
+
+def test_fails_fast_when_every_subreddit_is_turned_away(fake_reddit):
+    async def run():
+        server, scheduler = await fake_reddit(limit=2, burst=2, max_wait=1)
+        scheduler.tokens = 0
+        try:
+            with pytest.raises(RedditRateLimited):
+                await get_data.get_posts_from_subreddits(["alpha", "beta"], search_limit=30)
+        finally:
+            await get_data.close_reddit()
+
+        assert server.requests == 0
+
+    asyncio.run(run())
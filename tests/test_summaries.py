@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+import utils
+from cache import SummaryCache
+from metrics import cache_requests_total
+from posts import Post
+
+
+def cluster(name, size):
+    return [Post(subreddit="python", title=f"{name} {i}", content=f"{name} body {i}") for i in range(size)]
+
+
+@pytest.fixture
+def summary_cache(tmp_path, monkeypatch):
+    cache = SummaryCache(str(tmp_path / "summaries.sqlite3"))
+    monkeypatch.setattr(utils, "summary_cache", cache)
+    return cache
+
+
+def summary_lookups():
+    return {result: cache_requests_total.value(cache="summaries", result=result) for result in ("hit", "near_hit", "miss")}
+
+
+def test_cached_summaries_count_hits_near_hits_and_misses(summary_cache):
+    posts = cluster("crash", 10)
+    utils.store_summary(posts, utils.CategoryResponse(category="Crashes", pain_points="The app crashes."))
+    before = summary_lookups()
+
+    assert utils.get_cached_summary(posts).category == "Crashes"
+    # 9 of the 10 posts overlap with the cached cluster
+    assert utils.get_cached_summary(posts[:9]).category == "Crashes"
+    assert utils.get_cached_summary(cluster("login", 10)) is None
+
+    after = summary_lookups()
+    assert {result: after[result] - before[result] for result in after} == {"hit": 1, "near_hit": 1, "miss": 1}
+
+
+def test_batch_summaries_are_found_by_single_cluster_lookups(summary_cache):
+    posts = cluster("crash", 3)
+    utils.store_summary(posts, utils.CategoryResponse(category="Crashes", pain_points="The app crashes."), batched=True)
+
+    assert utils.get_cached_summary(posts).category == "Crashes"
+
+
+def test_batch_response_parsing_drops_bad_and_unknown_entries():
+    text = """{"categories": [
+        {"cluster_id": 1, "category": "Crashes", "pain_points": "The app crashes."},
+        {"cluster_id": "2", "category": "", "pain_points": "Empty category."},
+        {"cluster_id": 7, "category": "Unknown", "pain_points": "Not in the prompt."},
+        {"cluster_id": 1, "category": "Again", "pain_points": "Duplicate entry."},
+        {"category": "No ID", "pain_points": "Missing cluster ID."}
+    ]}"""
+
+    categories = utils._parse_batch_category_response(text, [1, 2, 3])
+
+    assert list(categories) == [1]
+    assert categories[1].category == "Crashes"
+    assert utils._parse_batch_category_response("Category: Crashes", [1]) == {}
+    assert utils._parse_batch_category_response('{"categories": "none"}', [1]) == {}
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def test_clusters_a_batch_misses_are_summarized_on_their_own(summary_cache, monkeypatch):
+    calls = []
+
+    async def generate_json(prompt, schema):
+        calls.append(schema.__name__)
+        if schema is utils.BatchCategoryResponse:
+            # Answer for cluster 0 only
+            return FakeResponse('{"categories": [{"cluster_id": 0, "category": "Crashes", "pain_points": "The app crashes."}]}')
+        return FakeResponse('{"category": "Logins", "pain_points": "Users cannot log in."}')
+
+    monkeypatch.setattr(utils, "generate_json", generate_json)
+    monkeypatch.setattr(utils, "LLM_BATCH_SUMMARIES", True)
+    categorized = {-1: cluster("noise", 2), 0: cluster("crash", 3), 1: cluster("login", 3)}
+
+    categories = asyncio.run(utils.summarize_pain_points(categorized))
+
+    assert calls == ["BatchCategoryResponse", "CategoryResponse"]
+    assert {cluster_id: category["category"] for cluster_id, category in categories.items()} == {0: "Crashes", 1: "Logins"}
+
+    # Both summaries are cached, so a second run makes no LLM call
+    calls.clear()
+    assert asyncio.run(utils.summarize_pain_points(categorized)).keys() == categories.keys()
+    assert calls == []
@@ -0,0 +1,64 @@
+import numpy as np
+
+import utils
+from topic_store import TopicModelStore
+
+
+def blobs(sizes, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(len(sizes), 32))
+    return np.vstack([center + 0.1 * rng.normal(size=(size, 32)) for center, size in zip(centers, sizes)])
+
+
+def test_centroids_round_trip_with_versions(tmp_path):
+    store = TopicModelStore(str(tmp_path))
+    centroids = np.eye(3, 8, dtype=np.float32)
+
+    first = store.save_centroids("python", centroids, {"outlier_share": 0.1})
+    second = store.save_centroids("python", centroids * 2, {"outlier_share": 0.2})
+    loaded, metadata = store.load_centroids("python")
+
+    assert (first["version"], second["version"]) == (1, 2)
+    np.testing.assert_allclose(loaded, centroids * 2)
+    assert metadata["outlier_share"] == 0.2
+    assert store.load_centroids("devops") is None
+    # No temporary files are left behind
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_fit_or_update_kmeans_reuses_stored_centroids(tmp_path, monkeypatch):
+    store = TopicModelStore(str(tmp_path))
+    monkeypatch.setattr(utils, "topic_model_store", store)
+    fits = []
+    kmeans_labels = utils.kmeans_labels
+
+    def counted_kmeans_labels(embeddings):
+        fits.append(len(embeddings))
+        return kmeans_labels(embeddings)
+
+    monkeypatch.setattr(utils, "kmeans_labels", counted_kmeans_labels)
+    embeddings = blobs([60, 40])
+    docs = [f"post {i}" for i in range(100)]
+
+    labels = utils.fit_or_update_kmeans(docs, embeddings, "python")
+    assert utils.fit_or_update_kmeans(docs, embeddings, "python") == labels
+    assert len(fits) == 1
+    assert store.load_centroids("kmeans:python")[1]["version"] == 1
+
+    # Mostly unseen posts are clustered again
+    utils.fit_or_update_kmeans([f"new post {i}" for i in range(100)], embeddings, "python")
+    assert len(fits) == 2
+
+
+def test_fit_or_update_kmeans_refits_old_centroids(tmp_path, monkeypatch):
+    store = TopicModelStore(str(tmp_path))
+    monkeypatch.setattr(utils, "topic_model_store", store)
+    embeddings = blobs([60, 40])
+    docs = [f"post {i}" for i in range(100)]
+
+    utils.fit_or_update_kmeans(docs, embeddings, "python")
+    # Any stored centroids are now too old
+    monkeypatch.setattr(utils, "TOPIC_MODEL_MAX_AGE", -1.0)
+    utils.fit_or_update_kmeans(docs, embeddings, "python")
+
+    assert store.load_centroids("kmeans:python")[1]["version"] == 2
@@ -0,0 +1,146 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class TopicModelStore:
+    """
+    Fitted topic models saved on disk, one per key (e.g. a set of subreddits)
+
+    Each entry is a pickled BERTopic model, or the cluster centroids of a k-means
+    fit, plus a JSON metadata file holding its version, fit timestamp and
+    whatever the caller needs to decide when to refit.
+    Files are written to a temporary name and renamed, so concurrent workers
+    never read a half-written model. A per-key file lock is held while a model
+    and its metadata are written and while they are read, so a model is never
+    paired with the metadata of another save.
+
+    Args:
+        directory: Directory holding the models
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, key: str, extension: str = ".pickle") -> Tuple[str, str]:
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+        base = os.path.join(self.directory, name)
+        return f"{base}{extension}", f"{base}.json"
+
+    @contextmanager
+    def _locked(self, key: str, exclusive: bool) -> Iterator[None]:
+        model_path, _ = self._paths(key)
+        with open(os.path.splitext(model_path)[0] + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load_metadata(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the metadata of the model stored under key, or None
+        """
+        _, metadata_path = self._paths(key)
+        try:
+            with open(metadata_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, key: str, embedding_model: Any = None) -> Optional[Tuple[Any, Dict[str, Any]]]:
+        """
+        Return (model, metadata) stored under key, or None if there is no usable model
+        """
+        from bertopic import BERTopic
+
+        model_path, _ = self._paths(key)
+        with self._locked(key, exclusive=False):
+            metadata = self.load_metadata(key)
+            if metadata is None or not os.path.exists(model_path):
+                return None
+            try:
+                model = BERTopic.load(model_path, embedding_model=embedding_model)
+            except Exception as e:
+                logger.error("Error loading topic model for %s: %s", key, e)
+                return None
+        return model, metadata
+
+    def load_centroids(self, key: str) -> Optional[Tuple[np.ndarray, Dict[str, Any]]]:
+        """
+        Return (centroids, metadata) stored under key, or None if there are none
+        """
+        centroids_path, _ = self._paths(key, ".npy")
+        with self._locked(key, exclusive=False):
+            metadata = self.load_metadata(key)
+            if metadata is None or not os.path.exists(centroids_path):
+                return None
+            try:
+                centroids = np.load(centroids_path)
+            except (OSError, ValueError) as e:
+                logger.error("Error loading centroids for %s: %s", key, e)
+                return None
+        return centroids, metadata
+
+    def save(self, key: str, model: Any, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Save model under key, stamping the metadata with a new version and the fit time
+
+        Returns:
+            The metadata as saved
+        """
+        model_path, _ = self._paths(key)
+        return self._save(
+            key, model_path,
+            lambda path: model.save(path, serialization="pickle", save_embedding_model=False),
+            metadata,
+        )
+
+    def save_centroids(self, key: str, centroids: np.ndarray, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Save the centroids of a k-means fit under key, stamping the metadata like save
+
+        Returns:
+            The metadata as saved
+        """
+        def write(path: str) -> None:
+            # A file object, since np.save would append .npy to the temporary name
+            with open(path, "wb") as f:
+                np.save(f, np.asarray(centroids, dtype=np.float32))
+
+        centroids_path, _ = self._paths(key, ".npy")
+        return self._save(key, centroids_path, write, metadata)
+
+    def _save(self, key: str, model_path: str, write: Callable[[str], None], metadata: Dict[str, Any]) -> Dict[str, Any]:
+        _, metadata_path = self._paths(key)
+        suffix = f".{os.getpid()}.tmp"
+        try:
+            # Serialize before taking the lock; only the version and the renames need it
+            write(model_path + suffix)
+            with self._locked(key, exclusive=True):
+                previous = self.load_metadata(key) or {}
+                metadata = {
+                    **metadata,
+                    "key": key,
+                    "version": previous.get("version", 0) + 1,
+                    "fitted_at": time.time(),
+                }
+                with open(metadata_path + suffix, "w") as f:
+                    json.dump(metadata, f)
+                os.replace(model_path + suffix, model_path)
+                os.replace(metadata_path + suffix, metadata_path)
+        finally:
+            for path in (model_path + suffix, metadata_path + suffix):
+                if os.path.exists(path):
+                    os.remove(path)
+        return metadata
@@ -1,96 +1,371 @@
-from typing import Dict, List
-from bertopic import BERTopic
-from sentence_transformers import SentenceTransformer
-import pandas as pd
-from IPython.display import display, HTML
-import ollama
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 import os
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field, validator
-from google import genai
+import asyncio
 import json
+import logging
+import time
 from functools import lru_cache
-from umap import UMAP
-from hdbscan import HDBSCAN
+import numpy as np
+from embedding_store import EmbeddingStore, text_hash
+from embedding_backends import load_embedding_model, EMBEDDING_BACKEND, EMBEDDING_MAX_SEQ_LENGTH
+from llm import generate_json, GEMINI_MODEL
+from cache import SummaryCache
+from prompts import build_batch_summary_prompt, build_summary_prompt, pack_clusters, BATCH_PROMPT_VERSION, PROMPT_VERSION
+from topic_store import TopicModelStore
+from clustering import agglomerative_labels, assign_to_centroids, cluster_centroids, kmeans_labels, CLUSTER_SMALL_MAX, CLUSTER_MEDIUM_MAX
+from filtering import post_text
+from posts import Post
+from pain_classifier import PainPointClassifier, PAIN_PROTOTYPES, OTHER_PROTOTYPES, PAIN_CLASSIFIER_HEAD, PAIN_SCORE_THRESHOLD, load_head
+from metrics import cache_requests_total, llm_batch_fallbacks_total, posts_total, timed
 
 # Load environment variables
 load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-# Cache for models
-@lru_cache(maxsize=1)
-def get_bertopic_model():
-    umap_model = UMAP(n_neighbors=15, n_components=5, min_dist=0.0, metric='cosine')
-    hdbscan_model = HDBSCAN(min_cluster_size=15, metric='euclidean', cluster_selection_method='eom', prediction_data=True)
+logger = logging.getLogger(__name__)
+
+# Seconds allowed to summarize one cluster, including retries
+LLM_CLUSTER_TIMEOUT = float(os.getenv("LLM_CLUSTER_TIMEOUT", "60"))
+# Summarize clusters of at most LLM_BATCH_MAX_POSTS posts together, up to LLM_BATCH_MAX_CLUSTERS per LLM call
+LLM_BATCH_SUMMARIES = os.getenv("LLM_BATCH_SUMMARIES", "true").lower() in ("1", "true", "yes")
+LLM_BATCH_MAX_POSTS = int(os.getenv("LLM_BATCH_MAX_POSTS", "5"))
+LLM_BATCH_MAX_CLUSTERS = int(os.getenv("LLM_BATCH_MAX_CLUSTERS", "8"))
+
+# Embedding model and the on-disk store of embeddings it has already computed
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# Backends and truncation lengths produce different vectors, so stored embeddings and models are kept per both;
+# the model's default length keeps the plain ID
+EMBEDDING_ID = f"{EMBEDDING_MODEL}@{EMBEDDING_BACKEND}" + (f"@seq{EMBEDDING_MAX_SEQ_LENGTH}" if EMBEDDING_MAX_SEQ_LENGTH else "")
+EMBEDDING_STORE_DTYPE = os.getenv("EMBEDDING_STORE_DTYPE", "float16")
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+
+# Cluster summaries keyed by their member posts; near matches need this Jaccard overlap
+SUMMARY_CACHE_TTL = float(os.getenv("SUMMARY_CACHE_TTL", str(7 * 24 * 3600)))
+SUMMARY_CACHE_MIN_JACCARD = float(os.getenv("SUMMARY_CACHE_MIN_JACCARD", "0.8"))
+summary_cache = SummaryCache(os.path.join(CACHE_DIR, "summaries.sqlite3"), ttl=SUMMARY_CACHE_TTL)
+
+# Fitted topic models and k-means centroids per subreddit set, and when to refit them instead of reusing them
+TOPIC_MODEL_MAX_AGE = float(os.getenv("TOPIC_MODEL_MAX_AGE", str(24 * 3600)))
+TOPIC_MODEL_REFIT_NEW_SHARE = float(os.getenv("TOPIC_MODEL_REFIT_NEW_SHARE", "0.3"))
+TOPIC_MODEL_REFIT_OUTLIER_DRIFT = float(os.getenv("TOPIC_MODEL_REFIT_OUTLIER_DRIFT", "0.15"))
+topic_model_store = TopicModelStore(os.path.join(CACHE_DIR, "topic_models"))
+
+def build_bertopic_model(n_docs: int = 0):
+    """
+    Create a fresh BERTopic model for large corpora; every job fits its own instance
+    
+    Args:
+        n_docs: Number of documents it will be fitted on, used to scale the minimum cluster size
+    """
+    # Heavy imports are deferred so importing this module stays cheap
+    from bertopic import BERTopic
+    from umap import UMAP
+    from hdbscan import HDBSCAN
+
+    umap_model = UMAP(n_neighbors=15, n_components=5, min_dist=0.0, metric='cosine', low_memory=True, random_state=42)
+    hdbscan_model = HDBSCAN(
+        min_cluster_size=max(10, n_docs // 200),
+        min_samples=5,
+        metric='euclidean',
+        cluster_selection_method='eom',
+        prediction_data=True,
+        core_dist_n_jobs=1
+    )
 
     return BERTopic(
-        embedding_model="all-MiniLM-L6-v2",
-        min_topic_size=2,
+        embedding_model=get_sentence_transformer(),
+        umap_model=umap_model,
+        hdbscan_model=hdbscan_model,
+        low_memory=True,
         verbose=True,
-        # umap_model=umap_model
     )
 
+# Cache for models
 @lru_cache(maxsize=1)
 def get_sentence_transformer():
-    return SentenceTransformer('all-MiniLM-L6-v2')
+    return load_embedding_model(EMBEDDING_MODEL, EMBEDDING_BACKEND)
+
+@lru_cache(maxsize=1)
+def get_embedding_store() -> EmbeddingStore:
+    model = get_sentence_transformer()
+    return EmbeddingStore(
+        os.path.join(CACHE_DIR, "embeddings", EMBEDDING_ID.replace("/", "__")),
+        dim=model.get_sentence_embedding_dimension(),
+        dtype=EMBEDDING_STORE_DTYPE
+    )
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """
+    Embed texts, reusing stored embeddings and batch-encoding only unseen texts
+    
+    Args:
+        texts: Texts to embed
+        
+    Returns:
+        Array of embeddings with one row per text
+    """
+    encoded = 0
+
+    def encode(missing: List[str]) -> np.ndarray:
+        nonlocal encoded
+        encoded = len(missing)
+        logger.debug("Encoding %d of %d texts", len(missing), len(texts))
+        return get_sentence_transformer().encode(
+            missing,
+            batch_size=EMBEDDING_BATCH_SIZE,
+            show_progress_bar=False
+        )
+
+    with timed("embed"):
+        embeddings = get_embedding_store().get_or_encode(texts, encode)
+    cache_requests_total.inc(len(texts) - encoded, cache="embeddings", result="hit")
+    cache_requests_total.inc(encoded, cache="embeddings", result="miss")
+    return embeddings
+
+@lru_cache(maxsize=1)
+def get_pain_classifier() -> PainPointClassifier:
+    return PainPointClassifier(
+        embed_texts(PAIN_PROTOTYPES),
+        embed_texts(OTHER_PROTOTYPES),
+        head=load_head(PAIN_CLASSIFIER_HEAD),
+    )
+
+def keep_pain_points(posts_data: List[Post], embeddings: np.ndarray) -> Tuple[List[Post], np.ndarray]:
+    """
+    Score posts with the pain-point classifier and drop those below PAIN_SCORE_THRESHOLD
+    
+    Args:
+        posts_data: Posts to score
+        embeddings: Their embeddings, one row per post
+        
+    Returns:
+        Tuple of (kept posts with a pain_score, their embeddings)
+    """
+    classifier = get_pain_classifier()
+    with timed("classify"):
+        scores = classifier.score(embeddings)
+        keep = np.flatnonzero(scores >= PAIN_SCORE_THRESHOLD)
+    logger.debug("Pain-point classifier kept %d of %d posts", len(keep), len(posts_data))
+    posts_total.inc(len(posts_data) - len(keep), outcome="not_pain_point")
+    kept = [posts_data[i] for i in keep]
+    for post, i in zip(kept, keep):
+        post.pain_score = round(float(scores[i]), 3)
+    return kept, embeddings[keep]
+
+def new_document_share(metadata: Dict, doc_hashes: List[str]) -> float:
+    """
+    Return the share of documents a stored model was not fitted on
+    """
+    known = set(metadata.get("doc_hashes", []))
+    return sum(doc_hash not in known for doc_hash in doc_hashes) / len(doc_hashes)
+
+def is_reusable(metadata: Dict, new_share: float) -> bool:
+    """
+    Whether a stored model was fitted on the same embeddings, recently, and on most of the documents
+    """
+    return (
+        metadata.get("embedding_model") == EMBEDDING_ID
+        and time.time() - metadata.get("fitted_at", 0) <= TOPIC_MODEL_MAX_AGE
+        and new_share <= TOPIC_MODEL_REFIT_NEW_SHARE
+    )
+
+def fit_or_update_kmeans(docs: List[str], embeddings: np.ndarray, model_key: str) -> List[int]:
+    """
+    Assign clusters with the stored k-means centroids for model_key, running k-means only when needed
+    
+    The centroids are reused under the same conditions as the topic models of
+    fit_or_update_topics; documents are assigned to their most similar centroid.
+    
+    Args:
+        docs: Documents to assign
+        embeddings: Embeddings of the documents
+        model_key: Key of the stored centroids, e.g. the sorted subreddit names
+        
+    Returns:
+        Cluster ID of every document (-1 for outliers)
+    """
+    # Kept apart from the BERTopic model of the same subreddits, which may be fitted on a larger request
+    store_key = f"kmeans:{model_key}"
+    doc_hashes = [text_hash(doc) for doc in docs]
+    stored = topic_model_store.load_centroids(store_key)
+    if stored is not None:
+        centroids, metadata = stored
+        new_share = new_document_share(metadata, doc_hashes)
+        if is_reusable(metadata, new_share):
+            labels = assign_to_centroids(embeddings, centroids)
+            outlier_share = labels.count(-1) / len(labels)
+            if outlier_share - metadata.get("outlier_share", 0) <= TOPIC_MODEL_REFIT_OUTLIER_DRIFT:
+                logger.info("Reused k-means centroids v%s for %s (%.0f%% new documents)", metadata['version'], model_key, new_share * 100)
+                return labels
+            logger.info("K-means centroids for %s drifted (outliers %.0f%%), refitting", model_key, outlier_share * 100)
+
+    labels = kmeans_labels(embeddings)
+    try:
+        metadata = topic_model_store.save_centroids(store_key, cluster_centroids(embeddings, labels), {
+            "embedding_model": EMBEDDING_ID,
+            "doc_hashes": sorted(set(doc_hashes)),
+            "outlier_share": labels.count(-1) / len(labels),
+        })
+        logger.info("Saved k-means centroids v%s for %s", metadata['version'], model_key)
+    except Exception as e:
+        logger.error("Error saving k-means centroids for %s: %s", model_key, e)
+
+    return labels
+
+def fit_or_update_topics(docs: List[str], embeddings: np.ndarray, model_key: str) -> List[int]:
+    """
+    Assign topics with the stored model for model_key, refitting only when needed
+    
+    The stored model is reused through transform() unless it is older than
+    TOPIC_MODEL_MAX_AGE, the share of documents it was not fitted on exceeds
+    TOPIC_MODEL_REFIT_NEW_SHARE, or the outlier share has drifted more than
+    TOPIC_MODEL_REFIT_OUTLIER_DRIFT above the one seen at fit time.
+    
+    Args:
+        docs: Documents to assign
+        embeddings: Embeddings of the documents
+        model_key: Key of the stored model, e.g. the sorted subreddit names
+        
+    Returns:
+        Topic ID of every document
+    """
+    import bertopic
 
-def categorize_posts(posts_data: List[Dict]) -> Dict:
+    doc_hashes = [text_hash(doc) for doc in docs]
+    stored = topic_model_store.load(model_key, embedding_model=get_sentence_transformer())
+    if stored is not None:
+        topic_model, metadata = stored
+        new_share = new_document_share(metadata, doc_hashes)
+        if metadata.get("bertopic_version") == bertopic.__version__ and is_reusable(metadata, new_share):
+            topics, _ = topic_model.transform(docs, embeddings=embeddings)
+            topics = [int(topic) for topic in topics]
+            outlier_share = topics.count(-1) / len(topics)
+            if outlier_share - metadata.get("outlier_share", 0) <= TOPIC_MODEL_REFIT_OUTLIER_DRIFT:
+                logger.info("Reused topic model v%s for %s (%.0f%% new documents)", metadata['version'], model_key, new_share * 100)
+                return topics
+            logger.info("Topic model for %s drifted (outliers %.0f%%), refitting", model_key, outlier_share * 100)
+
+    # Use a model private to this job
+    topic_model = build_bertopic_model(len(docs))
+    topics, probs = topic_model.fit_transform(docs, embeddings=embeddings)
+    topics = [int(topic) for topic in topics]
+
+    try:
+        metadata = topic_model_store.save(model_key, topic_model, {
+            "bertopic_version": bertopic.__version__,
+            "embedding_model": EMBEDDING_ID,
+            "doc_hashes": sorted(set(doc_hashes)),
+            "outlier_share": topics.count(-1) / len(topics),
+        })
+        logger.info("Saved topic model v%s for %s", metadata['version'], model_key)
+    except Exception as e:
+        logger.error("Error saving topic model for %s: %s", model_key, e)
+
+    return topics
+
+def assign_clusters(docs: List[str], embeddings: np.ndarray, model_key: str) -> List[int]:
     """
-    Group similar pain points into categories using BERTopic
+    Cluster documents with a strategy picked by corpus size
+    
+    Small corpora use NumPy agglomerative clustering and medium ones spherical
+    k-means with stored centroids, both on normalized embeddings; large corpora
+    use UMAP/HDBSCAN through a stored BERTopic model.
     
     Args:
-        posts_data: List of post dictionaries from Reddit
+        docs: Documents to cluster
+        embeddings: Embeddings of the documents
+        model_key: Key of the stored centroids or topic model for the medium and large paths
         
     Returns:
-        Dict of post clusters keyed by cluster ID
+        Cluster ID of every document (-1 for outliers)
+    """
+    if len(docs) <= CLUSTER_SMALL_MAX:
+        return agglomerative_labels(embeddings)
+    if len(docs) <= CLUSTER_MEDIUM_MAX:
+        return fit_or_update_kmeans(docs, embeddings, model_key)
+    return fit_or_update_topics(docs, embeddings, model_key)
+
+def order_by_centroid_similarity(indices: List[int], embeddings: np.ndarray) -> List[int]:
     """
+    Order the members of a cluster by cosine similarity to the cluster centroid
+    
+    Args:
+        indices: Row indices of the cluster members in embeddings
+        embeddings: Embeddings of all posts
+        
+    Returns:
+        indices, most representative first
+    """
+    vectors = embeddings[indices]
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarity = vectors @ vectors.mean(axis=0)
+    return [indices[i] for i in np.argsort(-similarity, kind="stable")]
+
+def categorize_posts(posts_data: List[Post]) -> Dict:
+    """
+    Group similar pain points into categories, with a clustering strategy
+    suited to the number of posts (see assign_clusters)
+    
+    Posts the pain-point classifier scores below PAIN_SCORE_THRESHOLD are left
+    out; kept posts carry their pain_score.
+    
+    Args:
+        posts_data: Posts from Reddit
+        
+    Returns:
+        Dict of post clusters keyed by cluster ID, each ordered from the post
+        closest to the cluster centroid to the farthest
+    """
+    if not posts_data:
+        return {}
+    
+    # Drop posts that do not describe a pain point
+    try:
+        embeddings = embed_texts([post_text(post) for post in posts_data])
+        posts_data, embeddings = keep_pain_points(posts_data, embeddings)
+    except Exception as e:
+        logger.error("Error embedding posts: %s", e)
+        return {0: posts_data}
+    
     # Extract content for topic modeling
-    all_post_contents = [post['content'] for post in posts_data]
-    print("len(all_post_contents): ", len(all_post_contents))
+    all_post_contents = [post_text(post) for post in posts_data]
     
     # Skip categorization if there are not enough posts
-    if len(all_post_contents) < 5:  # Minimum threshold
-        print(f"Not enough posts ({len(all_post_contents)}) for topic modeling. Returning all posts in a single category.")
-        return {0: posts_data}  # Return all posts in a single category
+    if len(all_post_contents) < 2:  # Minimum threshold
+        logger.info("Not enough posts (%d) for clustering, returning them in a single category", len(all_post_contents))
+        posts_total.inc(len(posts_data), outcome="clustered")
+        return {0: posts_data} if posts_data else {}  # Return all posts in a single category
     
     try:
-        # Use cached model
-        topic_model = get_bertopic_model()
-        
-        # Process in batches if there are many posts
-        # batch_size = 100
-        # all_topics = []
-        # all_probs = []
-        
-        # for i in range(0, len(all_post_contents), batch_size):
-        #     batch = all_post_contents[i:i + batch_size]
-        #     batch_topics, batch_probs = topic_model.fit_transform(batch)
-        #     all_topics.extend(batch_topics)
-        #     if batch_probs is not None:
-        #         all_probs.extend(batch_probs)
-            
-        #     # Clear batch data
-        #     del batch
-        #     del batch_topics
-        #     del batch_probs
-        
-        topics, probs = topic_model.fit_transform(all_post_contents)
-        # Group posts by cluster
-        categorized_posts = {}
-        for i, cluster in enumerate(topics):
-            if cluster not in categorized_posts:
-                categorized_posts[cluster] = []
-            categorized_posts[cluster].append(posts_data[i])
-        
-        # # Clear large data structures
-        # del all_post_contents
-        # del all_topics
-        # del all_probs
+        model_key = ",".join(sorted({post.subreddit.lower() for post in posts_data}))
+        with timed("cluster"):
+            topics = assign_clusters(all_post_contents, embeddings, model_key)
+            # Group posts by cluster, most representative posts first
+            cluster_indices = {}
+            for i, cluster in enumerate(topics):
+                if cluster not in cluster_indices:
+                    cluster_indices[cluster] = []
+                cluster_indices[cluster].append(i)
+            categorized_posts = {
+                cluster: [posts_data[i] for i in order_by_centroid_similarity(indices, embeddings)]
+                for cluster, indices in cluster_indices.items()
+            }
+        
+        # Outliers (cluster -1) are not summarized
+        outliers = len(categorized_posts.get(-1, []))
+        posts_total.inc(len(posts_data) - outliers, outcome="clustered")
+        posts_total.inc(outliers, outcome="outlier")
+        logger.info(
+            "Clustered %d posts into %d clusters, %d outliers",
+            len(posts_data), len([cluster for cluster in categorized_posts if cluster != -1]), outliers
+        )
         
         return categorized_posts
     
     except Exception as e:
-        print(f"Error in topic modeling: {str(e)}")
+        logger.error("Error in topic modeling: %s", e)
         # Fallback: return all posts in a single category
         return {0: posts_data}
 
@@ -104,99 +379,264 @@ class CategoryResponse(BaseModel):
             raise ValueError("Field cannot be empty")
         return v
 
-def summarize_pain_points(categorized_posts: Dict) -> Dict:
+def _parse_category_response(text: str) -> CategoryResponse:
+    """
+    Parse the LLM output into a CategoryResponse, falling back to line-based parsing
     """
-    Summarize each category of posts using Ollama
+    try:
+        parsed_json = json.loads(text)
+        return CategoryResponse(**parsed_json)
+    except (json.JSONDecodeError, ValueError, TypeError):
+        category = "Uncategorized"
+        pain_points = "No clear pain points identified."
+        
+        lines = (text or "").split('\n')
+        for line in lines:
+            if line.lower().startswith("category:"):
+                category = line[line.find(":")+1:].strip() or category
+            elif line.lower().startswith("pain points:"):
+                pain_points = line[line.find(":")+1:].strip() or pain_points
+        
+        return CategoryResponse(
+            category=category,
+            pain_points=pain_points
+        )
+
+async def summarize_cluster(posts: List[Post]) -> CategoryResponse:
+    """
+    Summarize one cluster of posts with the LLM
     
     Args:
-        categorized_posts: Dict of post clusters keyed by cluster ID
+        posts: Posts in the cluster, most representative first
         
     Returns:
-        Dict of categories with summaries keyed by cluster ID
+        Validated category name and pain point summary
     """
-    # Get model name from environment or use default
-    # model = os.getenv("LLM_MODEL", "qwen2.5:7b")
-    
-    
-    # Summarize each category
+    prompt = build_summary_prompt(posts)
+
+    llm_response = await generate_json(prompt, CategoryResponse)
+    return _parse_category_response(llm_response.text)
+
+class ClusterCategoryResponse(CategoryResponse):
+    cluster_id: int = Field(..., description="The cluster ID given in the prompt")
+
+class BatchCategoryResponse(BaseModel):
+    categories: List[ClusterCategoryResponse] = Field(..., description="One entry per cluster in the prompt")
+
+def _parse_batch_category_response(text: str, cluster_ids: List[Any]) -> Dict[Any, CategoryResponse]:
+    """
+    Parse the LLM output of a batch summary into categories keyed by cluster ID
+
+    Unlike _parse_category_response there is no lenient fallback: entries that
+    fail validation or name an unknown cluster are dropped, so their clusters
+    can be summarized on their own.
+    """
+    try:
+        entries = json.loads(text).get("categories")
+    except (json.JSONDecodeError, AttributeError, TypeError):
+        return {}
+    if not isinstance(entries, list):
+        return {}
+
+    by_id = {str(cluster): cluster for cluster in cluster_ids}
     categories = {}
-    for cluster, posts in categorized_posts.items():
-        # Skip outlier topic
-        if cluster == -1:
+    for entry in entries:
+        try:
+            parsed = ClusterCategoryResponse(**entry)
+        except (ValueError, TypeError):
             continue
-            
+        cluster = by_id.get(str(parsed.cluster_id))
+        if cluster is not None and cluster not in categories:
+            categories[cluster] = CategoryResponse(category=parsed.category, pain_points=parsed.pain_points)
+    return categories
+
+async def summarize_clusters_batch(clusters: List[Tuple[Any, List[Post]]]) -> Dict[Any, CategoryResponse]:
+    """
+    Summarize several clusters of posts with one LLM call
+    
+    Args:
+        clusters: (cluster ID, posts) pairs that fit one prompt, e.g. a batch of prompts.pack_clusters
+        
+    Returns:
+        Validated category name and pain point summary keyed by cluster ID;
+        clusters the response missed or got wrong are left out
+    """
+    prompt = build_batch_summary_prompt(clusters)
+
+    llm_response = await generate_json(prompt, BatchCategoryResponse)
+    return _parse_batch_category_response(llm_response.text, [cluster for cluster, _ in clusters])
+
+def post_key(post: Post) -> str:
+    """
+    Return a stable key for a post, used to fingerprint the clusters it belongs to
+    """
+    return text_hash(f"{post.title}\n{post.content}")
+
+async def summarize_cluster_cached(posts: List[Post], use_cache: bool = True) -> CategoryResponse:
+    """
+    Summarize a cluster, reusing the cached summary of the same (or a largely
+    overlapping) set of posts made with the same model and prompt version
+    
+    Args:
+        posts: Posts in the cluster
+        use_cache: Whether a cached summary may be returned; new summaries are always stored
+        
+    Returns:
+        Validated category name and pain point summary
+    """
+    if use_cache:
+        cached = get_cached_summary(posts)
+        if cached is not None:
+            return cached
+
+    category_model = await summarize_cluster(posts)
+    store_summary(posts, category_model)
+    return category_model
+
+def _summary_namespace(batched: bool = False) -> str:
+    # Each prompt has its own version, so changing one does not invalidate summaries made with the other
+    if batched:
+        return f"{GEMINI_MODEL}:batch-{BATCH_PROMPT_VERSION}"
+    return f"{GEMINI_MODEL}:{PROMPT_VERSION}"
+
+def get_cached_summary(posts: List[Post]) -> Optional[CategoryResponse]:
+    """
+    Return the cached summary of the same (or a largely overlapping) set of posts,
+    made with either the single-cluster or the batch prompt, or None
+    """
+    members = [post_key(post) for post in posts]
+    cached, overlap = None, 0.0
+    for batched in (False, True):
+        value, score = summary_cache.match(members, _summary_namespace(batched), min_jaccard=SUMMARY_CACHE_MIN_JACCARD)
+        # An exact match under either prompt beats a near match under the other
+        if value is not None and score > overlap:
+            cached, overlap = value, score
+    if cached is None:
+        cache_requests_total.inc(cache="summaries", result="miss")
+        return None
+    cache_requests_total.inc(cache="summaries", result="hit" if overlap >= 1.0 else "near_hit")
+    return CategoryResponse(**cached)
+
+def store_summary(posts: List[Post], category_model: CategoryResponse, batched: bool = False) -> None:
+    """
+    Cache the summary of a cluster of posts under the version of the prompt that made it
+    """
+    summary_cache.set([post_key(post) for post in posts], _summary_namespace(batched), category_model.model_dump())
+
+async def iter_pain_point_summaries(categorized_posts: Dict, timeout: float = LLM_CLUSTER_TIMEOUT, use_cache: bool = True) -> AsyncIterator[Tuple[Any, Dict]]:
+    """
+    Summarize each category of posts using Gemini, yielding categories as they finish
+    
+    Clusters are summarized concurrently within the limits of llm.llm_limiter;
+    a cluster that fails or exceeds the timeout is skipped. With
+    LLM_BATCH_SUMMARIES, uncached clusters of at most LLM_BATCH_MAX_POSTS posts
+    are packed into batches summarized with one LLM call each; clusters a batch
+    response misses or gets wrong are summarized on their own.
+    
+    Args:
+        categorized_posts: Dict of post clusters keyed by cluster ID
+        timeout: Seconds allowed per cluster or batch, including retries
+        use_cache: Whether cached summaries may be reused
+        
+    Yields:
+        Tuples of (cluster ID, category with summary) in order of completion
+    """
+    def category(posts, category_model):
+        # Store the validated and structured data
+        return {
+            'category': category_model.category,
+            'pain_points': category_model.pain_points,
+            'posts': posts,
+        }
+
+    async def summarize(cluster, posts, use_cache=use_cache):
         try:
-            # Process one cluster at a time
-            post_contents = "\n".join([post['content'] for post in posts])
-
-            print("Number of words: ", len(post_contents.split(' ')))
-
-            
-            prompt = f"""
-            Based on these related posts, identify the common pain point or problem these users are experiencing.
-
-            Posts:
-            {post_contents}
-
-            You must respond in valid JSON format with exactly these fields:
-
-            category: A category name that best describes these related issues
-            pain_points: 2-4 sentences summarizing the shared problems
-
-            Do not include any other text, explanations, or formatting in your response.
-            There should be only one category and one pain point.
-
-            Make it short and concise.
-            """
-            
-            # Clear post contents after creating prompt
-            del post_contents
-            
-            client = genai.Client(api_key=GEMINI_API_KEY)
-            llm_response = client.models.generate_content(
-                model="gemini-2.0-flash-lite",
-                contents=prompt,
-                config={
-                    'response_mime_type': 'application/json',
-                    'response_schema': CategoryResponse,
-                },
-            )
-
-            try:
-                parsed_json = json.loads(llm_response.text)
-                category_model = CategoryResponse(**parsed_json)
-            except (json.JSONDecodeError, ValueError):
-                category = "Uncategorized"
-                pain_points = "No clear pain points identified."
-                
-                lines = llm_response.split('\n')
-                for line in lines:
-                    if line.lower().startswith("category:"):
-                        category = line[line.find(":")+1:].strip()
-                    elif line.lower().startswith("pain points:"):
-                        pain_points = line[line.find(":")+1:].strip()
-                
-                category_model = CategoryResponse(
-                    category=category,
-                    pain_points=pain_points
-                )
-            
-            # Store the validated and structured data
-            categories[cluster] = {
-                'category': category_model.category,
-                'pain_points': category_model.pain_points,
-                'posts': posts,
-            }
-            
-            # Clear response data
-            del llm_response
-            del category_model
-            
+            category_model = await asyncio.wait_for(summarize_cluster_cached(posts, use_cache), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Error summarizing cluster %s: timed out after %g seconds", cluster, timeout)
+            return [(cluster, None)]
+        except Exception as e:
+            logger.error("Error summarizing cluster %s: %s", cluster, e)
+            return [(cluster, None)]
+        return [(cluster, category(posts, category_model))]
+
+    async def summarize_batch(batch):
+        clusters = ", ".join(str(cluster) for cluster, _ in batch)
+        try:
+            category_models = await asyncio.wait_for(summarize_clusters_batch(batch), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Error summarizing clusters %s: timed out after %g seconds", clusters, timeout)
+            return [(cluster, None) for cluster, _ in batch]
         except Exception as e:
-            print(f"Error summarizing cluster {cluster}: {str(e)}")
+            logger.error("Error summarizing clusters %s: %s", clusters, e)
+            return [(cluster, None) for cluster, _ in batch]
+
+        results = []
+        for cluster, posts in batch:
+            if cluster in category_models:
+                store_summary(posts, category_models[cluster], batched=True)
+                results.append((cluster, category(posts, category_models[cluster])))
+        missing = [(cluster, posts) for cluster, posts in batch if cluster not in category_models]
+        if missing:
+            logger.warning("Batch summary missed clusters %s, summarizing them one by one", ", ".join(str(cluster) for cluster, _ in missing))
+            llm_batch_fallbacks_total.inc(len(missing))
+            # The cache was already checked for these clusters
+            for fallback in await asyncio.gather(*(summarize(cluster, posts, use_cache=False) for cluster, posts in missing)):
+                results.extend(fallback)
+        return results
+
+    # Skip outlier topic
+    clusters = [(cluster, posts) for cluster, posts in categorized_posts.items() if cluster != -1]
+    cached, small, single = [], [], []
+    for cluster, posts in clusters:
+        if not LLM_BATCH_SUMMARIES or len(posts) > LLM_BATCH_MAX_POSTS:
+            single.append((cluster, posts))
             continue
+        category_model = get_cached_summary(posts) if use_cache else None
+        if category_model is not None:
+            cached.append((cluster, category(posts, category_model)))
+        else:
+            small.append((cluster, posts))
+    batches = pack_clusters(small, max_clusters=LLM_BATCH_MAX_CLUSTERS)
+    # A batch of one cluster is summarized on its own, with the regular prompt
+    single.extend(batch[0] for batch in batches if len(batch) == 1)
+
+    # The cache was already checked for the small clusters
+    checked = {cluster for cluster, _ in small}
+    tasks = [
+        asyncio.ensure_future(summarize(cluster, posts, use_cache=use_cache and cluster not in checked))
+        for cluster, posts in single
+    ] + [asyncio.ensure_future(summarize_batch(batch)) for batch in batches if len(batch) > 1]
+    try:
+        for cluster, category_summary in cached:
+            yield cluster, category_summary
+        for next_done in asyncio.as_completed(tasks):
+            for cluster, category_summary in await next_done:
+                if category_summary is not None:
+                    yield cluster, category_summary
+    finally:
+        # Stop outstanding LLM calls if the consumer goes away early
+        for task in tasks:
+            task.cancel()
+
+async def summarize_pain_points(categorized_posts: Dict, timeout: float = LLM_CLUSTER_TIMEOUT, use_cache: bool = True) -> Dict:
+    """
+    Summarize each category of posts using Gemini
     
-    return categories
+    Args:
+        categorized_posts: Dict of post clusters keyed by cluster ID
+        timeout: Seconds allowed per cluster, including retries
+        use_cache: Whether cached summaries may be reused
+        
+    Returns:
+        Dict of categories with summaries keyed by cluster ID
+    """
+    categories = {}
+    async for cluster, category in iter_pain_point_summaries(categorized_posts, timeout, use_cache):
+        categories[cluster] = category
+    
+    # Keep the cluster order of the input
+    return {cluster: categories[cluster] for cluster in categorized_posts if cluster in categories}
 
 # def extract_pain_points_summary(categories: Dict) -> List[Dict]:
 #     """